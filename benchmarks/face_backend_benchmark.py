@@ -0,0 +1,96 @@
+"""
+Compare face detector backends on a local image corpus.
+
+The corpus is one directory per person:
+
+    corpus/
+        alice/1.jpg  alice/2.jpg ...
+        bob/1.jpg ...
+
+Every image is run through the same pipeline as /attendace/validate/images
+(pre-process, quality gate, detect, encode) in this process, once per
+backend. For each backend it reports per-image latency percentiles, how
+many images were rejected, and verification accuracy over all image pairs
+at the configured FACE_MATCH_THRESHOLD: genuine pairs (same person) that
+matched and impostor pairs (different people) that did not.
+
+    python -m benchmarks.face_backend_benchmark corpus/ --detectors hog haar dnn
+"""
+import argparse
+import itertools
+import pathlib
+import time
+
+import numpy as np
+
+from src.attendance_routes.attendance_setting import FACE_MATCH_THRESHOLD, FACE_ENCODER
+from src.attendance_routes.face_backends import DETECTORS
+from src.attendance_routes.face_worker import analyze_face
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def load_corpus(root: pathlib.Path) -> list[tuple[str, bytes]]:
+    images = []
+    for person in sorted(p for p in root.iterdir() if p.is_dir()):
+        for path in sorted(person.iterdir()):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                images.append((person.name, path.read_bytes()))
+    return images
+
+
+def run_backend(detector: str, images: list[tuple[str, bytes]], threshold: float) -> None:
+    latencies, encodings, rejected = [], [], {}
+    for person, content in images:
+        start = time.perf_counter()
+        result = analyze_face(content, quality_gate=True, detector=detector, encoder=FACE_ENCODER)
+        latencies.append(time.perf_counter() - start)
+        if result["encoding"] is None:
+            rejected[result["error"]] = rejected.get(result["error"], 0) + 1
+        else:
+            encodings.append((person, result["encoding"]))
+
+    genuine = genuine_ok = impostor = impostor_ok = 0
+    for (p1, e1), (p2, e2) in itertools.combinations(encodings, 2):
+        matched = float(np.linalg.norm(e1 - e2)) < threshold
+        if p1 == p2:
+            genuine += 1
+            genuine_ok += matched
+        else:
+            impostor += 1
+            impostor_ok += not matched
+
+    ms = np.asarray(latencies) * 1000
+    pairs = genuine + impostor
+    print(f"\n[{detector}] {len(images)} images, {len(encodings)} encoded")
+    print(f"  latency ms  p50 {np.percentile(ms, 50):7.1f}  p90 {np.percentile(ms, 90):7.1f}"
+          f"  p99 {np.percentile(ms, 99):7.1f}  max {ms.max():7.1f}")
+    for error, count in sorted(rejected.items()):
+        print(f"  rejected    {count:4d}  {error}")
+    if pairs:
+        print(f"  genuine     {genuine_ok}/{genuine} matched"
+              f" ({genuine_ok / genuine:.1%})" if genuine else "  genuine     no pairs")
+        print(f"  impostor    {impostor_ok}/{impostor} rejected"
+              f" ({impostor_ok / impostor:.1%})" if impostor else "  impostor    no pairs")
+        print(f"  accuracy    {(genuine_ok + impostor_ok) / pairs:.1%} at threshold {threshold}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", type=pathlib.Path)
+    parser.add_argument("--detectors", nargs="+", default=list(DETECTORS), choices=list(DETECTORS))
+    parser.add_argument("--threshold", type=float, default=FACE_MATCH_THRESHOLD)
+    args = parser.parse_args()
+
+    images = load_corpus(args.corpus)
+    if not images:
+        raise SystemExit(f"No images found under {args.corpus}")
+    for detector in args.detectors:
+        try:
+            run_backend(detector, images, args.threshold)
+        except RuntimeError as e:
+            print(f"\n[{detector}] skipped: {e}")
+
+
+if __name__ == "__main__":
+    main()
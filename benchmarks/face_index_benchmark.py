@@ -0,0 +1,73 @@
+"""
+Micro-benchmark for 1:N kiosk identification.
+
+Writes random 128-d encodings to a FaceIndex store in a temp directory and
+times index.search() (one vectorized distance pass over every user) against
+the naive per-user Python loop it replaces. "open" is the cold start of a
+new worker: mapping the existing store and running its first search.
+
+    python -m benchmarks.face_index_benchmark --users 1000 10000 50000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from src.attendance_routes.face_index import FaceIndex, FACE_DIM
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--loop-probes", type=int, default=5, help="probes for the slow per-user loop")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for n in args.users:
+        encodings = rng.normal(0, 0.1, size=(n, FACE_DIM)).astype(np.float32)
+        user_ids = [f"user-{i}" for i in range(n)]
+
+        directory = tempfile.mkdtemp(prefix="face_store_")
+        start = time.perf_counter()
+        FaceIndex(directory).replace_all(user_ids, encodings)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = FaceIndex(directory)
+        index.search(encodings[0], 1)
+        cold = time.perf_counter() - start
+
+        # Probes are noisy copies of enrolled faces, so the answer is known.
+        targets = rng.integers(0, n, size=args.probes)
+        probes = encodings[targets] + rng.normal(0, 0.01, size=(args.probes, FACE_DIM)).astype(np.float32)
+
+        timings, correct = [], 0
+        for target, probe in zip(targets, probes):
+            start = time.perf_counter()
+            user_id, _ = index.search(probe, 1)[0]
+            timings.append(time.perf_counter() - start)
+            correct += user_id == user_ids[target]
+
+        loop_timings = []
+        for probe in probes[:args.loop_probes]:
+            start = time.perf_counter()
+            min(range(n), key=lambda i: np.linalg.norm(encodings[i] - probe))
+            loop_timings.append(time.perf_counter() - start)
+
+        print(
+            f"{n:>7,} users | build {build * 1000:7.1f} ms | open {cold * 1000:6.1f} ms"
+            f" | search p50 {percentile_ms(timings, 50):6.2f} ms"
+            f" p95 {percentile_ms(timings, 95):6.2f} ms"
+            f" | per-user loop p50 {percentile_ms(loop_timings, 50):8.1f} ms"
+            f" | top-1 {correct}/{args.probes}"
+        )
+
+
+if __name__ == "__main__":
+    main()
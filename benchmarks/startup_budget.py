@@ -0,0 +1,72 @@
+"""
+Import-time and memory budget for the base app.
+
+Imports `main` in fresh interpreters and fails (exit 1) if the median
+import time or peak RSS is over budget, or if the face recognition stack
+(cv2, dlib, face_recognition, PIL) was loaded. That stack belongs in the
+face pool worker processes only; see attendance_routes/face_worker.py.
+
+    python -m benchmarks.startup_budget [--max-import-seconds 2.5] [--max-rss-mb 150]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+FORBIDDEN_MODULES = ("cv2", "dlib", "face_recognition", "face_recognition_models", "PIL")
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (FORBIDDEN_MODULES,)
+
+
+def measure() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, default=2.5)
+    parser.add_argument("--max-rss-mb", type=float, default=150)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    seconds = statistics.median(r["seconds"] for r in runs)
+    rss_mb = statistics.median(r["rss_mb"] for r in runs)
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+
+    print(f"import main : {seconds:6.2f} s   (budget {args.max_import_seconds:.2f} s)")
+    print(f"peak RSS    : {rss_mb:6.1f} MB  (budget {args.max_rss_mb:.0f} MB)")
+    print(f"vision stack: {', '.join(loaded) if loaded else 'not loaded'}")
+
+    failures = []
+    if seconds > args.max_import_seconds:
+        failures.append("import time over budget")
+    if rss_mb > args.max_rss_mb:
+        failures.append("RSS over budget")
+    if loaded:
+        failures.append(f"face recognition stack imported by the API process: {', '.join(loaded)}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
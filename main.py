@@ -1,14 +1,51 @@
 from fastapi import FastAPI 
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from src.login.login_routes import router as login_router
 from src.common_routes.user_routes import router as user_router
-app = FastAPI()
+from src.common_routes.ops_routes import router as ops_router
+from src.common_routes.common_checks import init_supabase_client, close_supabase_client
+from src.common_routes.common_checks import init_http_client, close_http_client
+from src.career_routes.career_checks import ensure_bucket
+from src.attendance_routes.attendance_checks import start_face_pool, stop_face_pool
+from src.attendance_routes.face_index import warm_face_index, register_face_index_jobs
+from src.attendance_routes.punch_buffer import punch_buffer
+from src.common_routes.scheduler import scheduler
+from src.common_routes.common_setting import SCHEDULER_ENABLED
+from src.calendar_routes.calendar_jobs import register_calendar_jobs
+import asyncio
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_supabase_client()
+    init_http_client()
+    await asyncio.to_thread(ensure_bucket)
+    start_face_pool()
+    face_index_preload = asyncio.create_task(warm_face_index())
+    punch_buffer.start()
+    if SCHEDULER_ENABLED:
+        register_calendar_jobs(scheduler)
+        register_face_index_jobs(scheduler)
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    face_index_preload.cancel()
+    await punch_buffer.stop()
+    # Waits for running encodes; keep the loop free meanwhile
+    await asyncio.to_thread(stop_face_pool)
+    await close_http_client()
+    close_supabase_client()
+
+
+app = FastAPI(lifespan=lifespan)
 import logging
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 from src.career_routes.careers_routes import router as careers_router
 from src.calendar_routes.calendar_main_routes import router as calendar_router
 #from src.leaves_routes.leaves_main_routes import router as leaves_router
 from src.attendance_routes.attendance_main_routes import router as attendance_router
+from src.attendance_routes.attendance_stream_routes import router as attendance_stream_router
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
@@ -22,6 +59,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by browser clients to fetch the next page of user lists
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(login_router)
@@ -30,3 +69,5 @@ app.include_router(careers_router)
 app.include_router(calendar_router)
 # app.include_router(leaves_router)
 app.include_router(attendance_router)
+app.include_router(attendance_stream_router)
+app.include_router(ops_router)
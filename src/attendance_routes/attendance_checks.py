@@ -1,53 +1,442 @@
-import face_recognition
-import cv2
 import os
 from fastapi import UploadFile,Depends,HTTPException,status
-import tempfile
 
 
-import requests
-import io
-from typing import Union,List,Dict,Optional,Any
+import asyncio
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Union,List,Dict,Optional,Any,Callable,Awaitable
+from collections import OrderedDict
 from datetime import datetime, date, timedelta
 from enum import Enum
 from src.common_routes.common_checks import get_supabase_client
 from supabase import Client,create_client
+from src.career_routes.career_checks import read_object, stat_uploaded_object
+from .attendance_setting import FACE_WORKERS, FACE_QUEUE_SIZE, FACE_RETRY_AFTER_SECONDS
+from .attendance_setting import FACE_DETECTOR, FACE_ENCODER, FACE_UPSAMPLE, FACE_MATCH_THRESHOLD
+from .attendance_setting import FACE_BORDERLINE_MARGIN
+from .attendance_setting import REFERENCE_CACHE_SIZE
+from .face_backends import get_detector, get_encoder
+from . import face_worker
+from .face_worker import encode_face, analyze_face
 import logging
 logger = logging.getLogger(__name__)
 
-async def validate_images(img1: UploadFile, img2: Union[UploadFile, str]):
-    # Handle img1 (always UploadFile)
+# users column holding the 128-d face encoding computed at enrollment
+FACE_ENCODING_COLUMN = "face_encoding"
+# users column holding the individual encodings of a multi-image enrollment
+# (a list of 128-d lists); FACE_ENCODING_COLUMN then holds their centroid.
+# Schema: ALTER TABLE users ADD COLUMN face_samples float4[];  (2-D, samples x 128)
+FACE_SAMPLES_COLUMN = "face_samples"
+
+# async (user_ids) -> {user_id: samples}, called only for borderline matches
+SamplesLoader = Callable[[List[str]], Awaitable[Dict[str, List[List[float]]]]]
+
+# Dedicated process pool so dlib detection/encoding never runs on the
+# event loop. Admission is bounded: FACE_WORKERS running + FACE_QUEUE_SIZE waiting.
+_face_pool: ProcessPoolExecutor | None = None
+_face_slots: asyncio.Semaphore | None = None
+
+
+def start_face_pool() -> ProcessPoolExecutor:
+    """
+    Start the worker processes and make each one load the dlib models,
+    so the first check after startup doesn't pay for it.
+    """
+    global _face_pool
+    if _face_pool is None:
+        # Fail at startup rather than in every worker on a typo
+        get_detector(FACE_DETECTOR)
+        get_encoder(FACE_ENCODER)
+        _face_pool = ProcessPoolExecutor(
+            max_workers=FACE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=face_worker.warm_up,
+        )
+        for _ in range(FACE_WORKERS):
+            _face_pool.submit(face_worker.ping)
+        logger.info(
+            "Face recognition pool started with %d workers (detector=%s, upsample=%d, encoder=%s, threshold=%.2f)",
+            FACE_WORKERS, FACE_DETECTOR, FACE_UPSAMPLE, FACE_ENCODER, FACE_MATCH_THRESHOLD,
+        )
+    return _face_pool
+
+
+def stop_face_pool() -> None:
+    global _face_pool
+    if _face_pool is not None:
+        _face_pool.shutdown(wait=True, cancel_futures=True)
+        _face_pool = None
+        logger.info("Face recognition pool stopped")
+
+
+async def run_face_job(fn: Callable, *args: Any) -> Any:
+    """
+    Run fn(*args) in the face pool. Rejects with 503 + Retry-After when
+    every worker is busy and the wait queue is full.
+    """
+    global _face_pool, _face_slots
+    if _face_slots is None:
+        _face_slots = asyncio.Semaphore(FACE_WORKERS + FACE_QUEUE_SIZE)
+    if _face_slots.locked():
+        logger.warning("Face recognition pool saturated; rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Face recognition is busy, please retry shortly",
+            headers={"Retry-After": str(FACE_RETRY_AFTER_SECONDS)},
+        )
+    async with _face_slots:
+        pool = start_face_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge image); replace the pool
+            logger.error("Face recognition pool broken; restarting it")
+            if _face_pool is pool:
+                _face_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Face recognition is restarting, please retry shortly",
+                headers={"Retry-After": str(FACE_RETRY_AFTER_SECONDS)},
+            )
+
+
+def compare_encodings(probe: np.ndarray, reference: np.ndarray) -> dict:
+    distance = float(np.linalg.norm(reference - probe))
+    matched = distance < FACE_MATCH_THRESHOLD
+
+    return {
+        "matched": bool(matched),  # Convert numpy.bool_ to Python bool
+        "distance": round(distance, 3),
+        "confidence": round(1 - distance, 3),
+    }
+
+
+def compare_encodings_batch(probes: np.ndarray, references: np.ndarray) -> List[dict]:
+    """
+    Row-wise compare_encodings for (m, 128) probe/reference matrices in one
+    vectorized pass.
+    """
+    distances = np.linalg.norm(references - probes, axis=1)
+    return [
+        {
+            "matched": bool(distance < FACE_MATCH_THRESHOLD),
+            "distance": round(float(distance), 3),
+            "confidence": round(float(1 - distance), 3),
+        }
+        for distance in distances
+    ]
+
+
+async def enroll_face(content: bytes) -> Optional[List[float]]:
+    """
+    Encodes a profile picture for storage in FACE_ENCODING_COLUMN.
+    Returns None (enrollment skipped) if no face is found.
+    """
+    encoding = await run_face_job(encode_face, content)
+    if encoding is None:
+        logger.warning("No face found in profile picture; face encoding not stored")
+        return None
+    return encoding.tolist()
+
+
+def face_centroid(encodings: np.ndarray) -> np.ndarray:
+    """
+    Mean of a user's enrollment encodings, stored as their reference.
+    """
+    return np.asarray(encodings, dtype=np.float32).mean(axis=0)
+
+
+def is_borderline(distance: float) -> bool:
+    """
+    A centroid reject close enough to the threshold for the samples to
+    decide. Accepts are never re-checked, so a rescore can only turn a
+    narrow reject into an accept.
+    """
+    return FACE_MATCH_THRESHOLD <= distance <= FACE_MATCH_THRESHOLD + FACE_BORDERLINE_MARGIN
+
+
+def rescore_with_samples(result: dict, probe: np.ndarray, samples: List[List[float]]) -> dict:
+    """
+    Re-decides a borderline centroid comparison on the nearest individual
+    enrollment sample, keeping the centroid distance if it is smaller.
+    """
+    distances = np.linalg.norm(np.asarray(samples, dtype=np.float32) - probe, axis=1)
+    distance = float(distances.min())
+    if distance >= result["distance"]:
+        return {**result, "centroid_distance": result["distance"], "method": "centroid"}
+    return {
+        **result,
+        "matched": bool(distance < FACE_MATCH_THRESHOLD),
+        "distance": round(distance, 3),
+        "confidence": round(1 - distance, 3),
+        "centroid_distance": result["distance"],
+        "method": "nearest_sample",
+    }
+
+
+class ReferenceCache:
+    """
+    Bounded LRU of reference encodings keyed by (object name, etag).
+    Replacing the object changes its etag, so stale entries are never hit.
+    A cached None means the image has no detectable face.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, str], Optional[np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, object_name: str, etag: str) -> Any:
+        with self._lock:
+            key = (object_name, etag)
+            if key not in self._entries:
+                return self.MISSING
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, object_name: str, etag: str, encoding: Optional[np.ndarray]) -> None:
+        with self._lock:
+            self._entries[(object_name, etag)] = encoding
+            self._entries.move_to_end((object_name, etag))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+reference_cache = ReferenceCache(REFERENCE_CACHE_SIZE)
+
+
+async def reference_encoding(object_name: str) -> Optional[np.ndarray]:
+    """
+    Encoding of a reference image stored in MinIO. A HEAD (stat) gives the
+    etag; only on a cache miss is the object streamed with get_object and
+    encoded in the face pool. No URL signing or HTTP client involved.
+    """
+    stat = await stat_uploaded_object(object_name)
+    if stat is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reference image not found",
+        )
+    encoding = reference_cache.get(object_name, stat.etag)
+    if encoding is ReferenceCache.MISSING:
+        encoding = await run_face_job(encode_face, await read_object(object_name))
+        reference_cache.put(object_name, stat.etag, encoding)
+    return encoding
+
+
+async def try_enroll_face(content: bytes) -> Optional[List[float]]:
+    """
+    enroll_face for user create/update routes: never fails the request.
+    Users left without an encoding are enrolled on their first attendance
+    check or by the face_backfill command.
+    """
+    try:
+        return await enroll_face(content)
+    except Exception as e:
+        logger.warning("Face enrollment skipped: %s", getattr(e, "detail", e))
+        return None
+
+
+async def analyze_probe(content: bytes) -> dict:
+    """
+    Runs the pre-process/quality-gate/encode pipeline on a probe image in
+    the face pool. Stage timings are logged and returned as timings_ms.
+    """
+    analysis = await run_face_job(analyze_face, content)
+    logger.debug("Face pipeline timings (ms): %s error=%s", analysis["timings_ms"], analysis["error"])
+    return analysis
+
+
+async def analyze_enrollment(contents: List[bytes]) -> List[dict]:
+    """
+    Runs every enrollment image through the probe pipeline (quality gate
+    included) in parallel across the face pool. A failing image yields an
+    analysis with an error instead of failing the others.
+    """
+    analyses = await asyncio.gather(
+        *(analyze_probe(content) for content in contents),
+        return_exceptions=True,
+    )
+    return [
+        {"encoding": None, "error": getattr(analysis, "detail", "Processing error"), "timings_ms": {}}
+        if isinstance(analysis, BaseException) else analysis
+        for analysis in analyses
+    ]
+
+
+def rejected_probe(analysis: dict) -> dict:
+    return {
+        "matched": False,
+        "error": analysis["error"],
+        "timings_ms": analysis["timings_ms"],
+    }
+
+
+async def validate_against_encoding(
+    img1: UploadFile,
+    reference: List[float],
+    load_samples: Optional[SamplesLoader] = None,
+    user_id: Optional[str] = None,
+) -> dict:
+    """
+    Encodes only the probe image and compares it with the stored encoding.
+    """
+    return await verify_probe(await img1.read(), reference, load_samples, user_id)
+
+
+async def verify_probe(
+    content: bytes,
+    reference: List[float],
+    load_samples: Optional[SamplesLoader] = None,
+    user_id: Optional[str] = None,
+) -> dict:
+    """
+    For users enrolled with several images the reference is their centroid;
+    a borderline distance is re-decided on the nearest individual sample.
+    """
+    analysis = await analyze_probe(content)
+    if analysis["encoding"] is None:
+        return rejected_probe(analysis)
+    result = compare_encodings(analysis["encoding"], np.asarray(reference, dtype=np.float32))
+    if load_samples is not None and is_borderline(result["distance"]):
+        samples = (await load_samples([user_id])).get(user_id)
+        if samples:
+            result = rescore_with_samples(result, analysis["encoding"], samples)
+    result["timings_ms"] = analysis["timings_ms"]
+    return result
+
+
+async def validate_batch(
+    items: List[Dict[str, Any]],
+    references: Dict[str, List[float]],
+    load_samples: Optional[SamplesLoader] = None,
+) -> List[dict]:
+    """
+    Verifies many (user_id, image) pairs at once. Probes are encoded in
+    parallel across the pool, FACE_WORKERS at a time, and compared in a single vectorized pass.
+    Each item gets its own result; one bad image never fails the batch.
+    `items` are {"user_id", "image"} dicts, or {"user_id", "error"} for
+    items already rejected by the caller. Borderline results are
+    re-decided on enrollment samples fetched in one load_samples call.
+    """
+    results: List[dict] = [
+        {"user_id": item["user_id"], "matched": False, "error": item["error"]}
+        if "error" in item else None
+        for item in items
+    ]
+    pending = [i for i, item in enumerate(items) if results[i] is None]
+    for i in pending:
+        if items[i]["user_id"] not in references:
+            results[i] = {"user_id": items[i]["user_id"], "matched": False, "error": "User has no enrolled face"}
+    pending = [i for i in pending if results[i] is None]
+
+    contents = await asyncio.gather(*(items[i]["image"].read() for i in pending))
+    # At most one pool slot per worker for this batch: the rest of the
+    # items wait here instead of filling the pool's queue, so a big batch
+    # neither gets its own items rejected with 503 nor crowds out others
+    slots = asyncio.Semaphore(FACE_WORKERS)
+
+    async def analyze(content: bytes) -> dict:
+        async with slots:
+            return await analyze_probe(content)
+
+    analyses = await asyncio.gather(
+        *(analyze(content) for content in contents),
+        return_exceptions=True,
+    )
+
+    matched_rows = []
+    for i, analysis in zip(pending, analyses):
+        user_id = items[i]["user_id"]
+        if isinstance(analysis, BaseException):
+            logger.warning("Batch probe for user_id=%s failed: %s", user_id, getattr(analysis, "detail", analysis))
+            results[i] = {"user_id": user_id, "matched": False, "error": getattr(analysis, "detail", "Processing error")}
+        elif analysis["encoding"] is None:
+            results[i] = {"user_id": user_id, **rejected_probe(analysis)}
+        else:
+            matched_rows.append((i, analysis))
+
+    if matched_rows:
+        probes = np.stack([analysis["encoding"] for _, analysis in matched_rows]).astype(np.float32)
+        refs = np.asarray([references[items[i]["user_id"]] for i, _ in matched_rows], dtype=np.float32)
+        for (i, analysis), result in zip(matched_rows, compare_encodings_batch(probes, refs)):
+            results[i] = {"user_id": items[i]["user_id"], **result, "timings_ms": analysis["timings_ms"]}
+
+        borderline = [(i, analysis) for i, analysis in matched_rows if is_borderline(results[i]["distance"])]
+        if load_samples is not None and borderline:
+            samples = await load_samples(list({items[i]["user_id"] for i, _ in borderline}))
+            for i, analysis in borderline:
+                user_samples = samples.get(items[i]["user_id"])
+                if user_samples:
+                    results[i] = rescore_with_samples(results[i], analysis["encoding"], user_samples)
+
+    return results
+
+
+async def identify_face(img1: UploadFile, index: Any, top_k: int = 1) -> dict:
+    """
+    1:N match of the probe image against every enrolled user in the
+    in-memory FaceIndex; only the probe is encoded.
+    """
     content1 = await img1.read()
-    image1 = face_recognition.load_image_file(io.BytesIO(content1))
-    
-    # Handle img2 (UploadFile or URL string)
-    if isinstance(img2, str):  # URL from database
-        response = requests.get(img2, timeout=10)
-        response.raise_for_status()
-        image2 = face_recognition.load_image_file(io.BytesIO(response.content))
+    analysis = await analyze_probe(content1)
+    if analysis["encoding"] is None:
+        return rejected_probe(analysis)
+    candidates = index.search(analysis["encoding"], top_k)
+    if not candidates:
+        # The last enrolled user was removed while the probe was encoded
+        return {
+            "matched": False,
+            "user_id": None,
+            "distance": None,
+            "confidence": None,
+            "candidates": [],
+            "timings_ms": analysis["timings_ms"],
+        }
+    user_id, distance = candidates[0]
+    matched = distance < FACE_MATCH_THRESHOLD
+    return {
+        "matched": bool(matched),
+        "user_id": user_id if matched else None,
+        "distance": round(distance, 3),
+        "confidence": round(1 - distance, 3),
+        "candidates": [
+            {"user_id": cid, "distance": round(d, 3)} for cid, d in candidates
+        ],
+        "timings_ms": analysis["timings_ms"],
+    }
+
+
+async def validate_images(img1: UploadFile, img2: Union[UploadFile, str]):
+    """
+    Compares two images. img2 is an upload or the MinIO object name of a
+    stored reference image (e.g. a user's profile picture).
+    """
+    if isinstance(img2, str):  # object name from database
+        content1 = await img1.read()
+        enc1, enc2 = await asyncio.gather(
+            run_face_job(encode_face, content1),
+            reference_encoding(img2),
+        )
     else:  # UploadFile
-        content2 = await img2.read()
-        image2 = face_recognition.load_image_file(io.BytesIO(content2))
-    
-    # Face encoding and comparison (same as before)
-    enc1 = face_recognition.face_encodings(image1)
-    enc2 = face_recognition.face_encodings(image2)
+        content1, content2 = await img1.read(), await img2.read()
+        # Face encoding in the worker pool, both images in parallel
+        enc1, enc2 = await asyncio.gather(
+            run_face_job(encode_face, content1),
+            run_face_job(encode_face, content2),
+        )
     
-    if not enc1 or not enc2:
+    if enc1 is None or enc2 is None:
         return {
             "matched": False,  # Native Python bool
             "error": "No face detected in one or both images"
         }
     
-    enc1 = enc1[0]
-    enc2 = enc2[0]
-    
-    distance = face_recognition.face_distance([enc1], enc2)[0]
-    matched = distance < 0.6
-    
-    return {
-        "matched": bool(matched),  # Convert numpy.bool_ to Python bool
-        "distance": float(round(distance, 3)),  # Convert numpy.float64 to Python float
-        "confidence": float(round(1 - distance, 3))  # Convert numpy.float64 to Python float
-    }
-
+    return compare_encodings(enc1, enc2)
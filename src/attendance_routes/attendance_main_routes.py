@@ -1,11 +1,17 @@
-from fastapi import APIRouter , UploadFile,File,HTTPException,Depends,security,status
+from fastapi import APIRouter , UploadFile,File,Form,HTTPException,Depends,security,status,Query,Path
 from fastapi.responses import JSONResponse
-from .attendance_checks import validate_images
+from .attendance_checks import validate_against_encoding, validate_batch, reference_encoding, identify_face, FACE_ENCODING_COLUMN
+from .attendance_checks import analyze_enrollment, face_centroid, FACE_SAMPLES_COLUMN
+from .attendance_setting import FACE_BATCH_MAX_ITEMS, FACE_ENROLL_MAX_IMAGES
+from .face_index import face_index, ensure_face_index, store_face
+from .punch_buffer import record_punch
+from .attendance_reports import month_calendar, month_rollup, month_holidays, summarize
 from supabase import Client
-from typing import Optional
-from src.common_routes.common_checks import get_supabase_client
+from typing import Optional, List, Literal, Dict
+import numpy as np
+import asyncio
+from src.common_routes.common_checks import get_supabase_client, run_query, apply_keyset, split_page
 from src.login.login_checks import get_current_user_id 
-from src.career_routes.career_checks import get_file_url
 from datetime import date, datetime , time
 import logging
 from datetime import date,timedelta
@@ -14,38 +20,308 @@ router = APIRouter(prefix="/attendace",tags=["take attaendance of users"],
     dependencies=[Depends(get_current_user_id)])
 
 
+async def enroll_from_profile_picture(supabase: Client, user_id: str, profile_picture: str) -> Optional[List[float]]:
+    """
+    Encodes the stored profile picture of a user created before encodings
+    were kept, and persists it so it is never fetched again.
+    """
+    logger.info(f"Enrolling face encoding from profile picture: {profile_picture}")
+    encoding = await reference_encoding(profile_picture)
+    if encoding is None:
+        logger.warning("No face found in profile picture; face encoding not stored")
+        return None
+    reference = encoding.tolist()
+    await run_query(supabase.table("users").update({FACE_ENCODING_COLUMN: reference}).eq("id", user_id))
+    await store_face(user_id, reference)
+    return reference
+
+
+async def user_reference(supabase: Client, user_id: str) -> Optional[List[float]]:
+    """
+    Reference encoding of a user: the shared face store first, then
+    Supabase, then a one-off enrollment from the profile picture.
+    None if the profile picture has no face.
+    """
+    # Zero-copy view into the shared face store; no Supabase round trip
+    reference = face_index.get(user_id)
+    if reference is not None:
+        return reference
+
+    user_response = await run_query(
+        supabase
+        .table("users")
+        .select(f"id, user_profile_picture, {FACE_ENCODING_COLUMN}")
+        .eq("id", user_id)
+        .maybe_single()
+    )
+
+    if not user_response or not user_response.data:
+        raise HTTPException(404, "User not found")
+
+    user_data = user_response.data
+    reference = user_data.get(FACE_ENCODING_COLUMN)
+    if reference:
+        # Enrolled but missing from the face store (e.g. enrolled by the
+        # backfill command): add it so the next check skips Supabase
+        await store_face(user_id, reference)
+        return reference
+
+    # Not enrolled yet (created before encodings were stored): encode the
+    # profile picture once and keep it
+    profile_picture = user_data.get("user_profile_picture")
+    if not profile_picture:
+        raise HTTPException(400, "User has no profile picture")
+
+    return await enroll_from_profile_picture(supabase, user_id, profile_picture)
+
+
+async def load_face_samples(user_ids: List[str]) -> Dict[str, List[List[float]]]:
+    """
+    Individual enrollment encodings of the given users, for re-deciding
+    borderline centroid matches. Users enrolled from a single image have none.
+    """
+    supabase = get_supabase_client()
+    res = await run_query(
+        supabase
+        .table("users")
+        .select(f"id, {FACE_SAMPLES_COLUMN}")
+        .in_("id", user_ids)
+    )
+    return {row["id"]: row[FACE_SAMPLES_COLUMN] for row in res.data or [] if row.get(FACE_SAMPLES_COLUMN)}
+
+
+@router.post("/enroll/{user_id}", summary="Enroll several face images for a user")
+async def enroll_user_faces(
+    user_id: str,
+    images: List[UploadFile] = File(..., description="Face images of the user, e.g. different angles and lighting"),
+    supabase: Client = Depends(get_supabase_client)
+):
+    try:
+        if len(images) > FACE_ENROLL_MAX_IMAGES:
+            raise HTTPException(413, f"At most {FACE_ENROLL_MAX_IMAGES} images per enrollment")
+        if any(not (image.content_type or "").startswith('image/') for image in images):
+            raise HTTPException(400, "Only image files allowed")
+
+        user_response = await run_query(
+            supabase.table("users").select("id").eq("id", user_id).maybe_single()
+        )
+        if not user_response or not user_response.data:
+            raise HTTPException(404, "User not found")
+
+        contents = await asyncio.gather(*(image.read() for image in images))
+        analyses = await analyze_enrollment(contents)
+        report = [
+            {"filename": image.filename, "accepted": analysis["encoding"] is not None, "error": analysis["error"]}
+            for image, analysis in zip(images, analyses)
+        ]
+        accepted = [analysis["encoding"] for analysis in analyses if analysis["encoding"] is not None]
+        if not accepted:
+            raise HTTPException(422, {"message": "No usable face in any of the images", "images": report})
+        samples = np.stack(accepted).astype(np.float32)
+
+        centroid = face_centroid(samples)
+        await run_query(
+            supabase
+            .table("users")
+            .update({FACE_ENCODING_COLUMN: centroid.tolist(), FACE_SAMPLES_COLUMN: samples.tolist()})
+            .eq("id", user_id)
+        )
+        await store_face(user_id, centroid)
+
+        spread = np.linalg.norm(samples - centroid, axis=1)
+        return {
+            "user_id": user_id,
+            "samples": len(samples),
+            "max_distance_to_centroid": round(float(spread.max()), 3),
+            "images": report,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Enrollment error: {str(e)}")
+        raise HTTPException(500, f"Processing error: {str(e)}")
+
+
 @router.post("/validate/images", summary="Check if uploaded image matches user's profile picture")
 async def validate_image(
     user_id: str,
     image1: UploadFile = File(..., description="Uploaded image to compare"),
+    punch_type: Literal["in", "out"] = Query("in", description="Punch recorded when the face matches"),
+    device: Optional[str] = Query(None, description="Id of the capturing device"),
     supabase: Client = Depends(get_supabase_client)
 ):
     try:
         if not image1.content_type.startswith('image/'):
             raise HTTPException(400, "Only image files allowed")
         
-        # Fix: Access data correctly from Supabase response
-        user_response = supabase.table("users").select("*").eq("id", user_id).maybe_single().execute()
-        
-        if not user_response.data:
-            raise HTTPException(404, "User not found")
-        
-        user_data = user_response.data  # Now correctly accessed
-        profile_picture = user_data.get("user_profile_picture")
-        
-        if not profile_picture:
-            raise HTTPException(400, "User has no profile picture")
-        
-        logger.info(f"User profile picture: {profile_picture}")
-        image2_url = await get_file_url(object_name=profile_picture)  # Fix: use profile_picture
-        # logger.info(f"Profile image URL: {image2_url}")
-        
-        result = await validate_images(image1, image2_url)
-        return result
+        reference = await user_reference(supabase, user_id)
+        if reference is None:
+            return {
+                "matched": False,
+                "error": "No face detected in the profile picture"
+            }
+
+        result = await validate_against_encoding(image1, reference, load_face_samples, user_id)
+        return record_punch(result, user_id, punch_type, device)
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(500, f"Processing error: {str(e)}")
-   
\ No newline at end of file
+
+
+@router.post("/validate/batch", summary="Check many (user_id, image) pairs in one request")
+async def validate_image_batch(
+    user_ids: List[str] = Form(..., description="User ids, paired by position with images"),
+    images: List[UploadFile] = File(..., description="Uploaded images to compare"),
+    punch_type: Literal["in", "out"] = Query("in", description="Punch recorded for each matching face"),
+    device: Optional[str] = Query(None, description="Id of the capturing device"),
+    supabase: Client = Depends(get_supabase_client)
+):
+    try:
+        if len(user_ids) != len(images):
+            raise HTTPException(400, "user_ids and images must have the same length")
+        if len(images) > FACE_BATCH_MAX_ITEMS:
+            raise HTTPException(413, f"At most {FACE_BATCH_MAX_ITEMS} images per batch")
+
+        # References come from the shared face store; only users missing
+        # from it are looked up, in one round trip
+        references = {}
+        for user_id in set(user_ids):
+            reference = face_index.get(user_id)
+            if reference is not None:
+                references[user_id] = reference
+        users = {user_id: {"id": user_id} for user_id in references}
+        missing = [user_id for user_id in set(user_ids) if user_id not in references]
+        if missing:
+            users_response = await run_query(
+                supabase
+                .table("users")
+                .select(f"id, user_profile_picture, {FACE_ENCODING_COLUMN}")
+                .in_("id", missing)
+            )
+            for row in users_response.data or []:
+                users[row["id"]] = row
+                if row.get(FACE_ENCODING_COLUMN):
+                    references[row["id"]] = row[FACE_ENCODING_COLUMN]
+                    await store_face(row["id"], row[FACE_ENCODING_COLUMN])
+
+        unenrolled = [
+            user_id for user_id, row in users.items()
+            if user_id not in references and row.get("user_profile_picture")
+        ]
+        if unenrolled:
+            enrolled = await asyncio.gather(
+                *(enroll_from_profile_picture(supabase, user_id, users[user_id]["user_profile_picture"]) for user_id in unenrolled),
+                return_exceptions=True,
+            )
+            for user_id, reference in zip(unenrolled, enrolled):
+                if isinstance(reference, BaseException):
+                    logger.warning("Lazy enrollment failed for user_id=%s: %s", user_id, reference)
+                elif reference is not None:
+                    references[user_id] = reference
+
+        items = []
+        for user_id, image in zip(user_ids, images):
+            if user_id not in users:
+                items.append({"user_id": user_id, "error": "User not found"})
+            elif not (image.content_type or "").startswith('image/'):
+                items.append({"user_id": user_id, "error": "Only image files allowed"})
+            else:
+                items.append({"user_id": user_id, "image": image})
+
+        results = [
+            record_punch(result, result["user_id"], punch_type, device)
+            for result in await validate_batch(items, references, load_face_samples)
+        ]
+        return {
+            "total": len(results),
+            "matched": sum(1 for r in results if r.get("matched")),
+            "results": results,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch validation error: {str(e)}")
+        raise HTTPException(500, f"Processing error: {str(e)}")
+
+
+@router.post("/identify/image", summary="Identify which enrolled user is in the image (kiosk mode)")
+async def identify_image(
+    image1: UploadFile = File(..., description="Camera frame from the kiosk"),
+    top_k: int = Query(1, ge=1, le=10, description="Number of nearest candidates to return"),
+    punch_type: Literal["in", "out"] = Query("in", description="Punch recorded for the identified user"),
+    device: Optional[str] = Query(None, description="Id of the kiosk"),
+):
+    try:
+        if not image1.content_type.startswith('image/'):
+            raise HTTPException(400, "Only image files allowed")
+
+        index = await ensure_face_index()
+        if not len(index):
+            raise HTTPException(404, "No users are enrolled for face identification")
+
+        result = await identify_face(image1, index, top_k)
+        return record_punch(result, result.get("user_id"), punch_type, device)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Identification error: {str(e)}")
+        raise HTTPException(500, f"Processing error: {str(e)}")
+
+
+@router.get("/report/{year}/{month}", summary="Monthly attendance summary per employee")
+async def monthly_report(
+    year: int = Path(..., ge=2000, le=2100),
+    month: int = Path(..., ge=1, le=12),
+    user_id: Optional[str] = Query(None, description="Only this employee"),
+    supabase: Client = Depends(get_supabase_client)
+):
+    try:
+        cal = month_calendar(year, month)
+        rollup, holidays = await asyncio.gather(month_rollup(year, month), month_holidays(year, month))
+        working_days, working_days_elapsed, stats = summarize(rollup, cal, holidays)
+
+        employees = []
+        after = None
+        while True:
+            query = supabase.table("users").select("id, name, email, designation, created_at")
+            if user_id:
+                query = query.eq("id", user_id)
+            res = await run_query(apply_keyset(query, after, 1000))
+            users, after = split_page(res.data or [], 1000)
+            employees.extend(users)
+            if after is None:
+                break
+        if user_id and not employees:
+            raise HTTPException(404, "User not found")
+
+        absent = {"days_present": 0, "days_absent": working_days_elapsed, "late_arrivals": 0, "hours_worked": 0.0}
+        return {
+            "year": year,
+            "month": month,
+            "working_days": working_days,
+            "working_days_elapsed": working_days_elapsed,
+            "holidays": sorted(d.isoformat() for d in holidays),
+            "employees": [
+                {
+                    "user_id": user["id"],
+                    "name": user.get("name"),
+                    "email": user.get("email"),
+                    "designation": user.get("designation"),
+                    **stats.get(user["id"], absent),
+                }
+                for user in employees
+            ],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Report error: {str(e)}")
+        raise HTTPException(500, f"Processing error: {str(e)}")
+
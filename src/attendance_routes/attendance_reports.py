@@ -0,0 +1,253 @@
+"""
+Monthly attendance/timesheet rollups over attendance_punches.
+
+Punches are reduced with NumPy to one row per (employee, day) holding the
+first check-in and last check-out, then summed per employee. A closed
+month keeps that daily rollup as an immutable snapshot. The current month
+keeps its parsed punches and on each request only reads rows inserted
+since the last read, so dashboards never rescan a whole month of raw
+punches. "Since" follows insert order (created_at, set by the database),
+not punched_at: the write-behind buffer keeps a punch's original time
+however late it is written. Weekends and holidays come from the shared
+working-day calendar, so a report counts the same days off as the
+working-days API.
+"""
+import asyncio
+import calendar
+import logging
+import time
+import numpy as np
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from src.common_routes.common_checks import get_supabase_client, run_query, apply_keyset, split_page
+from src.calendar_routes.working_days import working_calendar
+from .attendance_setting import (
+    ATTENDANCE_TIMEZONE,
+    WORKDAY_START,
+    LATE_GRACE_MINUTES,
+    REPORT_LATE_PUNCH_SECONDS,
+    REPORT_SNAPSHOT_MONTHS,
+)
+from .punch_buffer import PUNCH_TABLE, punch_buffer
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+
+class MonthCalendar:
+    """
+    Local-time day boundaries for one month as epoch seconds, so punches
+    are bucketed into days with a single searchsorted (DST safe).
+    """
+
+    def __init__(self, year: int, month: int):
+        tz = ZoneInfo(ATTENDANCE_TIMEZONE)
+        hour, minute = (int(part) for part in WORKDAY_START.split(":"))
+        self.year, self.month = year, month
+        self.days = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
+        midnights = [datetime(d.year, d.month, d.day, tzinfo=tz) for d in self.days]
+        next_month = self.days[-1] + timedelta(days=1)
+        midnights.append(datetime(next_month.year, next_month.month, next_month.day, tzinfo=tz))
+        self.day_starts = np.array([m.timestamp() for m in midnights])
+        self.late_after = np.array([
+            datetime(d.year, d.month, d.day, hour, minute, tzinfo=tz).timestamp() + LATE_GRACE_MINUTES * 60
+            for d in self.days
+        ])
+        self.weekend = np.array([not working_calendar.weekmask[d.weekday()] for d in self.days])
+        self.start_iso = midnights[0].isoformat()
+        self.end_iso = midnights[-1].isoformat()
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+
+@lru_cache(maxsize=64)
+def month_calendar(year: int, month: int) -> MonthCalendar:
+    return MonthCalendar(year, month)
+
+
+class DailyRollup:
+    """
+    One entry per (employee, day) with at least one punch.
+    """
+
+    def __init__(self, user_ids: List[str], user: np.ndarray, day: np.ndarray, hours: np.ndarray, late: np.ndarray):
+        self.user_ids = user_ids
+        self.user = user
+        self.day = day
+        self.hours = hours
+        self.late = late
+
+    @classmethod
+    def empty(cls) -> "DailyRollup":
+        return cls([], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=bool))
+
+
+class MonthPunches:
+    """
+    Parsed punches of an open month plus the insert-order read watermark.
+    """
+
+    def __init__(self):
+        self.user_ids: List[str] = []
+        self.ts = np.empty(0)
+        self.is_in = np.empty(0, dtype=bool)
+        self.ids: set = set()
+        self.created_max: Optional[float] = None
+
+    def created_since(self) -> Optional[str]:
+        """
+        Lower created_at bound for the next read. It overlaps the newest
+        row seen by REPORT_LATE_PUNCH_SECONDS because concurrent inserts
+        can commit out of created_at order; rows read twice are skipped.
+        """
+        if self.created_max is None:
+            return None
+        return datetime.fromtimestamp(self.created_max - REPORT_LATE_PUNCH_SECONDS, tz=timezone.utc).isoformat()
+
+    def extend(self, rows: List[dict]) -> None:
+        created = [datetime.fromisoformat(row["created_at"]).timestamp() for row in rows if row.get("created_at")]
+        if created:
+            self.created_max = max(created + [self.created_max or 0.0])
+        rows = [row for row in rows if row["id"] not in self.ids]
+        self.ids.update(row["id"] for row in rows)
+        self.user_ids.extend(row["user_id"] for row in rows)
+        self.ts = np.concatenate([self.ts, [datetime.fromisoformat(row["punched_at"]).timestamp() for row in rows]])
+        self.is_in = np.concatenate([self.is_in, [row["punch_type"] == "in" for row in rows]])
+
+
+def rollup_punches(punches: MonthPunches, cal: MonthCalendar) -> DailyRollup:
+    """
+    Vectorized reduction of a month of punches to per-(employee, day)
+    hours (first check-in to last check-out) and late flags.
+    """
+    if not len(punches.ts):
+        return DailyRollup.empty()
+    ndays = len(cal)
+    user_ids, user = np.unique(np.asarray(punches.user_ids, dtype=object), return_inverse=True)
+    day = np.searchsorted(cal.day_starts, punches.ts, side="right") - 1
+    inside = (day >= 0) & (day < ndays)
+    key = (user * ndays + day)[inside]
+    ts, is_in = punches.ts[inside], punches.is_in[inside]
+    if not len(key):
+        return DailyRollup.empty()
+
+    order = np.argsort(key, kind="stable")
+    key, ts, is_in = key[order], ts[order], is_in[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    first_in = np.minimum.reduceat(np.where(is_in, ts, np.inf), starts)
+    last_out = np.maximum.reduceat(np.where(is_in, -np.inf, ts), starts)
+
+    group_key = key[starts]
+    g_day = group_key % ndays
+    worked = np.isfinite(first_in) & np.isfinite(last_out) & (last_out > first_in)
+    hours = np.where(worked, (last_out - first_in) / 3600, 0.0)
+    late = np.isfinite(first_in) & (first_in > cal.late_after[g_day])
+    return DailyRollup(list(user_ids), group_key // ndays, g_day, hours, late)
+
+
+_snapshots: "OrderedDict[Tuple[int, int], DailyRollup]" = OrderedDict()
+_open_months: Dict[Tuple[int, int], MonthPunches] = {}
+_month_locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+
+
+async def fetch_punches(start_iso: str, end_iso: str, created_since: Optional[str] = None) -> List[dict]:
+    """
+    Punches timed within [start_iso, end_iso), optionally only those
+    inserted at or after created_since, in insert order.
+    """
+    supabase = get_supabase_client()
+    rows: List[dict] = []
+    after = None
+    while True:
+        query = (
+            supabase
+            .table(PUNCH_TABLE)
+            .select("id, user_id, punch_type, punched_at, created_at")
+            .gte("punched_at", start_iso)
+            .lt("punched_at", end_iso)
+        )
+        if created_since is not None:
+            query = query.gte("created_at", created_since)
+        res = await run_query(apply_keyset(query, after, PAGE_SIZE, column="created_at"))
+        page, after = split_page(res.data or [], PAGE_SIZE, column="created_at")
+        rows.extend(page)
+        if after is None:
+            return rows
+
+
+async def month_rollup(year: int, month: int) -> DailyRollup:
+    key = (year, month)
+    if key in _snapshots:
+        _snapshots.move_to_end(key)
+        return _snapshots[key]
+
+    cal = month_calendar(year, month)
+    now = time.time()
+    if now < cal.day_starts[0]:
+        return DailyRollup.empty()
+
+    lock = _month_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        if key in _snapshots:
+            return _snapshots[key]
+
+        buffered = punch_buffer.pending_between(cal.day_starts[0], cal.day_starts[-1])
+        if now >= cal.day_starts[-1] + REPORT_LATE_PUNCH_SECONDS and not buffered:
+            # Closed and nothing for it still waiting in this worker's
+            # buffer: read once, keep the daily rollup forever
+            punches = MonthPunches()
+            punches.extend(await fetch_punches(cal.start_iso, cal.end_iso))
+            rollup = rollup_punches(punches, cal)
+            _snapshots[key] = rollup
+            while len(_snapshots) > REPORT_SNAPSHOT_MONTHS:
+                _snapshots.popitem(last=False)
+            _open_months.pop(key, None)
+            logger.info("Attendance snapshot stored for %d-%02d (%d punches)", year, month, len(punches.ts))
+            return rollup
+
+        # Open (or punches still buffered): read only rows inserted since
+        # the last read
+        punches = _open_months.setdefault(key, MonthPunches())
+        punches.extend(await fetch_punches(cal.start_iso, cal.end_iso, punches.created_since()))
+        return rollup_punches(punches, cal)
+
+
+async def month_holidays(year: int, month: int) -> set:
+    """
+    Holidays in the month that are days off (NON_WORKING_HOLIDAY_TYPES),
+    read through the holiday cache.
+    """
+    cal = month_calendar(year, month)
+    return set(await working_calendar.holidays_between(cal.days[0], cal.days[-1]))
+
+
+def summarize(rollup: DailyRollup, cal: MonthCalendar, holidays: set) -> Tuple[int, int, Dict[str, dict]]:
+    """
+    Per-employee totals. Absences only count working days that have
+    started, so a report for the current month is meaningful mid-month.
+    Returns (working_days, working_days_elapsed, {user_id: stats}).
+    """
+    working = ~cal.weekend & np.array([d not in holidays for d in cal.days])
+    elapsed = working & (cal.day_starts[:-1] <= time.time())
+    n = len(rollup.user_ids)
+    present = np.bincount(rollup.user, minlength=n)
+    present_elapsed = np.bincount(rollup.user, weights=elapsed[rollup.day], minlength=n)
+    late = np.bincount(rollup.user, weights=rollup.late & working[rollup.day], minlength=n)
+    hours = np.bincount(rollup.user, weights=rollup.hours, minlength=n)
+    working_elapsed = int(elapsed.sum())
+    stats = {
+        user_id: {
+            "days_present": int(present[i]),
+            "days_absent": working_elapsed - int(present_elapsed[i]),
+            "late_arrivals": int(late[i]),
+            "hours_worked": round(float(hours[i]), 2),
+        }
+        for i, user_id in enumerate(rollup.user_ids)
+    }
+    return int(working.sum()), working_elapsed, stats
@@ -0,0 +1,93 @@
+import os
+import tempfile
+from dotenv import load_dotenv
+load_dotenv()
+
+# Face recognition process pool: worker processes and how many extra
+# checks may wait for a free worker before new ones get a 503. Every API
+# worker starts its own pool, so by default the cores are split between
+# the WEB_CONCURRENCY workers (uvicorn's --workers); set FACE_WORKERS when
+# the worker count is passed another way.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY") or "1"))
+FACE_WORKERS = int(os.getenv("FACE_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+FACE_QUEUE_SIZE = int(os.getenv("FACE_QUEUE_SIZE", "32"))
+FACE_RETRY_AFTER_SECONDS = int(os.getenv("FACE_RETRY_AFTER_SECONDS", "2"))
+
+# Memory-mapped face store shared by the workers on a host (local disk),
+# the Supabase page size used when building it, and how often it is
+# compared with users.face_encoding and rebuilt if they differ.
+FACE_STORE_DIR = os.getenv("FACE_STORE_DIR", os.path.join(tempfile.gettempdir(), "hrm_face_store"))
+FACE_INDEX_LOAD_BATCH = int(os.getenv("FACE_INDEX_LOAD_BATCH", "1000"))
+FACE_INDEX_RECONCILE_SECONDS = int(os.getenv("FACE_INDEX_RECONCILE_SECONDS", "300"))
+
+# Max (user_id, image) pairs accepted by one batch verification request.
+FACE_BATCH_MAX_ITEMS = int(os.getenv("FACE_BATCH_MAX_ITEMS", "50"))
+
+# Pre-processing before face encoding: frames are downscaled so the longest
+# side is at most FACE_MAX_DIMENSION px, then rejected early if too dark
+# (mean grey level) or too blurry (variance of the Laplacian). 0 disables a check.
+FACE_MAX_DIMENSION = int(os.getenv("FACE_MAX_DIMENSION", "800"))
+FACE_MIN_BRIGHTNESS = float(os.getenv("FACE_MIN_BRIGHTNESS", "40"))
+FACE_MIN_SHARPNESS = float(os.getenv("FACE_MIN_SHARPNESS", "40"))
+
+# Face backends (see face_backends.py). FACE_DETECTOR: hog | cnn | haar | dnn.
+# FACE_UPSAMPLE applies to the dlib detectors (hog, cnn); each upsample
+# finds smaller faces at roughly 4x the cost. The dnn detector needs an
+# OpenCV face model, e.g. the res10 SSD caffemodel + deploy.prototxt.
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "hog").lower()
+FACE_UPSAMPLE = int(os.getenv("FACE_UPSAMPLE", "1"))
+FACE_DNN_MODEL = os.getenv("FACE_DNN_MODEL", "")
+FACE_DNN_CONFIG = os.getenv("FACE_DNN_CONFIG", "")
+FACE_DNN_CONFIDENCE = float(os.getenv("FACE_DNN_CONFIDENCE", "0.5"))
+
+# Encoder backend and its settings. Stored encodings are only comparable
+# with the encoder that produced them; re-run face_backfill after changing it.
+FACE_ENCODER = os.getenv("FACE_ENCODER", "dlib").lower()
+FACE_LANDMARK_MODEL = os.getenv("FACE_LANDMARK_MODEL", "small").lower()
+FACE_NUM_JITTERS = int(os.getenv("FACE_NUM_JITTERS", "1"))
+
+# Max euclidean distance between encodings that still counts as a match.
+# Lower is stricter; 0.6 is the dlib model's reference operating point.
+FACE_MATCH_THRESHOLD = float(os.getenv("FACE_MATCH_THRESHOLD", "0.6"))
+
+# Multi-image enrollment. Verification compares the probe with the user's
+# centroid encoding; only when that distance misses the threshold by at
+# most FACE_BORDERLINE_MARGIN are the individual samples loaded and the
+# nearest one decides.
+FACE_ENROLL_MAX_IMAGES = int(os.getenv("FACE_ENROLL_MAX_IMAGES", "10"))
+FACE_BORDERLINE_MARGIN = float(os.getenv("FACE_BORDERLINE_MARGIN", "0.05"))
+
+# Write-behind buffer for attendance punches: a batch insert is sent every
+# PUNCH_FLUSH_RECORDS punches or PUNCH_FLUSH_INTERVAL_MS, whichever comes
+# first. At most PUNCH_BUFFER_MAX punches are held while Supabase is down.
+PUNCH_FLUSH_RECORDS = int(os.getenv("PUNCH_FLUSH_RECORDS", "50"))
+PUNCH_FLUSH_INTERVAL_MS = int(os.getenv("PUNCH_FLUSH_INTERVAL_MS", "500"))
+PUNCH_BUFFER_MAX = int(os.getenv("PUNCH_BUFFER_MAX", "10000"))
+
+# Monthly attendance reports. Days and late arrivals are evaluated in
+# ATTENDANCE_TIMEZONE; a first check-in after WORKDAY_START plus
+# LATE_GRACE_MINUTES is late. Weekends and days off follow the calendar
+# settings (WEEKEND_DAYS, NON_WORKING_HOLIDAY_TYPES).
+ATTENDANCE_TIMEZONE = os.getenv("ATTENDANCE_TIMEZONE", "UTC")
+WORKDAY_START = os.getenv("WORKDAY_START", "09:30")
+LATE_GRACE_MINUTES = int(os.getenv("LATE_GRACE_MINUTES", "10"))
+# Open months are read incrementally by insert time; each read overlaps the
+# previous one by REPORT_LATE_PUNCH_SECONDS for inserts that commit out of
+# order. A month is only snapshotted once it has been over for this long
+# and this worker's punch buffer holds nothing for it.
+REPORT_LATE_PUNCH_SECONDS = int(os.getenv("REPORT_LATE_PUNCH_SECONDS", "300"))
+REPORT_SNAPSHOT_MONTHS = int(os.getenv("REPORT_SNAPSHOT_MONTHS", "24"))
+
+# Encodings of reference images read from MinIO, keyed by object name + etag.
+REFERENCE_CACHE_SIZE = int(os.getenv("REFERENCE_CACHE_SIZE", "512"))
+
+# WebSocket frame streams from camera kiosks. Frames are verified at most
+# every FACE_STREAM_MIN_INTERVAL_MS; each frame rejected by the quality gate
+# doubles the gap up to FACE_STREAM_MAX_INTERVAL_MS. Frames outside the byte
+# bounds are skipped without decoding. A stream ends after
+# FACE_STREAM_TIMEOUT_SECONDS without a verified frame.
+FACE_STREAM_MIN_INTERVAL_MS = int(os.getenv("FACE_STREAM_MIN_INTERVAL_MS", "100"))
+FACE_STREAM_MAX_INTERVAL_MS = int(os.getenv("FACE_STREAM_MAX_INTERVAL_MS", "1000"))
+FACE_STREAM_MIN_FRAME_BYTES = int(os.getenv("FACE_STREAM_MIN_FRAME_BYTES", "2048"))
+FACE_STREAM_MAX_FRAME_BYTES = int(os.getenv("FACE_STREAM_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+FACE_STREAM_TIMEOUT_SECONDS = float(os.getenv("FACE_STREAM_TIMEOUT_SECONDS", "30"))
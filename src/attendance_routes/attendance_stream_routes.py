@@ -0,0 +1,266 @@
+"""
+Streaming face verification for camera kiosks.
+
+The kiosk opens one WebSocket and sends JPEG frames as binary messages
+instead of posting a multipart request per attempt. The user's reference
+encoding is resolved once and stays resident for the connection. Only the
+newest frame is kept while a frame is being verified, frames are verified
+at an adaptive rate, and the stream ends on the first verified frame.
+
+Server messages are JSON:
+
+    {"event": "ready", "user_id": ...}
+    {"event": "frame", "frame": n, "matched": false, ...}   per verified-or-rejected frame
+    {"event": "verified", "frame": n, "matched": true, "punch": {...}, "stats": {...}}
+    {"event": "timeout", "stats": {...}}
+    {"event": "error", "status_code": ..., "detail": ...}
+"""
+import asyncio
+import logging
+import time
+import numpy as np
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query, status
+from starlette.websockets import WebSocketState
+from typing import Dict, List, Literal, Optional
+
+from src.common_routes.common_checks import get_supabase_client
+from src.login.login_checks import get_current_user_id
+from .attendance_checks import verify_probe
+from .attendance_main_routes import user_reference, load_face_samples
+from .attendance_setting import (
+    FACE_STREAM_MIN_INTERVAL_MS,
+    FACE_STREAM_MAX_INTERVAL_MS,
+    FACE_STREAM_MIN_FRAME_BYTES,
+    FACE_STREAM_MAX_FRAME_BYTES,
+    FACE_STREAM_TIMEOUT_SECONDS,
+)
+from .punch_buffer import record_punch
+
+logger = logging.getLogger(__name__)
+
+# Separate router: OAuth2PasswordBearer only reads HTTP requests, so the
+# stream authenticates its token itself
+router = APIRouter(prefix="/attendace", tags=["take attaendance of users"])
+
+JPEG_MAGIC = b"\xff\xd8"
+
+
+class FrameSlot:
+    """
+    Holds only the newest unprocessed frame. Frames that arrive while one
+    is being verified replace each other and are counted as dropped.
+    """
+
+    def __init__(self):
+        self.frame: Optional[bytes] = None
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def put(self, frame: bytes) -> None:
+        self.received += 1
+        if self.frame is not None:
+            self.dropped += 1
+        self.frame = frame
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def take(self) -> Optional[bytes]:
+        """
+        Next frame, or None once the client has disconnected.
+        """
+        while self.frame is None and not self.closed:
+            self._ready.clear()
+            await self._ready.wait()
+        frame, self.frame = self.frame, None
+        return frame
+
+    def newest(self, frame: bytes) -> bytes:
+        """
+        Swap in a frame that arrived while waiting, dropping `frame`.
+        """
+        if self.frame is None:
+            return frame
+        self.dropped += 1
+        frame, self.frame = self.frame, None
+        return frame
+
+
+def frame_skip_reason(frame: bytes, previous: Optional[bytes]) -> Optional[str]:
+    """
+    Byte-level checks that cost nothing compared to a decode. Blank or
+    covered cameras produce tiny JPEGs; a frozen camera repeats its frame.
+    """
+    if not frame.startswith(JPEG_MAGIC):
+        return "not a JPEG"
+    if len(frame) < FACE_STREAM_MIN_FRAME_BYTES:
+        return "too small"
+    if len(frame) > FACE_STREAM_MAX_FRAME_BYTES:
+        return "too large"
+    if frame == previous:
+        return "duplicate"
+    return None
+
+
+async def read_frames(websocket: WebSocket, slot: FrameSlot) -> None:
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                slot.put(message["bytes"])
+    finally:
+        slot.close()
+
+
+def stream_token(websocket: WebSocket, token: Optional[str]) -> str:
+    if token:
+        return token
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not credentials:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Not authenticated")
+    return credentials
+
+
+def is_open(websocket: WebSocket) -> bool:
+    return (
+        websocket.client_state == WebSocketState.CONNECTED
+        and websocket.application_state == WebSocketState.CONNECTED
+    )
+
+
+async def close_with_error(websocket: WebSocket, status_code: int, detail) -> None:
+    """
+    Send an error event and close, unless the client is already gone or
+    the socket was closed by the failing step itself.
+    """
+    if not is_open(websocket):
+        return
+    code = status.WS_1008_POLICY_VIOLATION if status_code < 500 else status.WS_1011_INTERNAL_ERROR
+    try:
+        await websocket.send_json({"event": "error", "status_code": status_code, "detail": detail})
+    except Exception as e:
+        logger.info("Could not send stream error: %s", e)
+    try:
+        if is_open(websocket):
+            await websocket.close(code=code)
+    except Exception as e:
+        logger.info("Could not close stream: %s", e)
+
+
+@router.websocket("/validate/stream")
+async def validate_stream(
+    websocket: WebSocket,
+    user_id: str,
+    punch_type: Literal["in", "out"] = Query("in", description="Punch recorded when a frame matches"),
+    device: Optional[str] = Query(None, description="Id of the capturing device"),
+    token: Optional[str] = Query(None, description="Access token, for clients that cannot set headers"),
+):
+    try:
+        get_current_user_id(stream_token(websocket, token))
+    except HTTPException as e:
+        logger.warning("Stream rejected for user_id=%s: %s", user_id, e.detail)
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    reader = None
+    try:
+        reference = await user_reference(get_supabase_client(), user_id)
+        if reference is None:
+            raise HTTPException(400, "No face detected in the profile picture")
+        # Resident for the connection; no store or Supabase lookups per frame
+        reference = np.array(reference, dtype=np.float32)
+        samples_cache: Dict[str, Optional[List[List[float]]]] = {}
+
+        async def load_samples(user_ids: List[str]) -> Dict[str, List[List[float]]]:
+            missing = [uid for uid in user_ids if uid not in samples_cache]
+            if missing:
+                samples_cache.update(dict.fromkeys(missing))
+                samples_cache.update(await load_face_samples(missing))
+            return {uid: samples_cache[uid] for uid in user_ids if samples_cache.get(uid)}
+
+        await websocket.send_json({"event": "ready", "user_id": user_id})
+
+        slot = FrameSlot()
+        reader = asyncio.create_task(read_frames(websocket, slot))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + FACE_STREAM_TIMEOUT_SECONDS
+        interval = FACE_STREAM_MIN_INTERVAL_MS / 1000
+        next_at = started
+        previous: Optional[bytes] = None
+        skipped = processed = 0
+
+        def stats() -> dict:
+            return {
+                "received": slot.received,
+                "dropped": slot.dropped,
+                "skipped": skipped,
+                "processed": processed,
+                "elapsed_ms": round((loop.time() - started) * 1000, 1),
+            }
+
+        while True:
+            try:
+                frame = await asyncio.wait_for(slot.take(), max(deadline - loop.time(), 0))
+                if frame is not None and next_at > loop.time():
+                    await asyncio.sleep(min(next_at, deadline) - loop.time())
+                    frame = slot.newest(frame)
+            except asyncio.TimeoutError:
+                frame = None
+            if loop.time() >= deadline:
+                await websocket.send_json({"event": "timeout", "stats": stats()})
+                await websocket.close()
+                return
+            if frame is None:
+                logger.info("Stream closed by client for user_id=%s: %s", user_id, stats())
+                return
+
+            reason = frame_skip_reason(frame, previous)
+            previous = frame
+            if reason:
+                skipped += 1
+                continue
+
+            processed += 1
+            try:
+                result = await verify_probe(frame, reference, load_samples, user_id)
+            except HTTPException as e:
+                if e.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+                    raise
+                # Face pool saturated: back off instead of failing the stream
+                interval = FACE_STREAM_MAX_INTERVAL_MS / 1000
+                next_at = loop.time() + interval
+                continue
+
+            if result["matched"]:
+                result = record_punch(result, user_id, punch_type, device)
+                await websocket.send_json({"event": "verified", "frame": processed, **result, "stats": stats()})
+                await websocket.close()
+                logger.info("Stream verified user_id=%s: %s", user_id, stats())
+                return
+
+            if "error" in result:
+                # Quality gate or no face: nobody in front of the camera yet
+                interval = min(interval * 2, FACE_STREAM_MAX_INTERVAL_MS / 1000)
+            else:
+                interval = FACE_STREAM_MIN_INTERVAL_MS / 1000
+            next_at = loop.time() + interval
+            await websocket.send_json({"event": "frame", "frame": processed, **result})
+
+    except WebSocketDisconnect:
+        logger.info("Stream disconnected for user_id=%s", user_id)
+    except HTTPException as e:
+        await close_with_error(websocket, e.status_code, e.detail)
+    except Exception as e:
+        logger.error(f"Stream validation error: {str(e)}")
+        await close_with_error(websocket, 500, f"Processing error: {str(e)}")
+    finally:
+        if reader is not None:
+            reader.cancel()
@@ -0,0 +1,123 @@
+"""
+Face detector and encoder backends, selected with FACE_DETECTOR and
+FACE_ENCODER. Like face_worker, this runs inside the worker processes.
+
+A detector takes (rgb, gray) images and returns face boxes as
+(top, right, bottom, left) tuples, largest face first. An encoder takes
+the rgb image and one box and returns a 128-d encoding or None.
+Vision libraries are imported on first use, in the worker processes.
+"""
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+from .attendance_setting import (
+    FACE_UPSAMPLE,
+    FACE_DNN_MODEL,
+    FACE_DNN_CONFIG,
+    FACE_DNN_CONFIDENCE,
+    FACE_LANDMARK_MODEL,
+    FACE_NUM_JITTERS,
+)
+
+Box = Tuple[int, int, int, int]
+Detector = Callable[[np.ndarray, np.ndarray], List[Box]]
+Encoder = Callable[[np.ndarray, Box], Optional[np.ndarray]]
+
+# OpenCV models are loaded once per worker process
+_haar_cascade = None
+_dnn_net = None
+
+
+def _largest_first(boxes: List[Box]) -> List[Box]:
+    return sorted(boxes, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]), reverse=True)
+
+
+def detect_hog(rgb: np.ndarray, gray: np.ndarray) -> List[Box]:
+    """dlib HOG + linear SVM: the original detector, CPU friendly."""
+    import face_recognition
+
+    return _largest_first(face_recognition.face_locations(rgb, FACE_UPSAMPLE, model="hog"))
+
+
+def detect_cnn(rgb: np.ndarray, gray: np.ndarray) -> List[Box]:
+    """dlib CNN (MMOD): most accurate, far too slow without a GPU."""
+    import face_recognition
+
+    return _largest_first(face_recognition.face_locations(rgb, FACE_UPSAMPLE, model="cnn"))
+
+
+def detect_haar(rgb: np.ndarray, gray: np.ndarray) -> List[Box]:
+    """OpenCV Haar cascade on the grey image: fastest, least accurate."""
+    import cv2
+
+    global _haar_cascade
+    if _haar_cascade is None:
+        if not hasattr(cv2, "CascadeClassifier"):
+            # OpenCV 5 moved Haar cascades out of the main package
+            raise RuntimeError("FACE_DETECTOR=haar requires OpenCV 4.x (opencv-python-headless<5)")
+        _haar_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    faces = _haar_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40))
+    return _largest_first([(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in faces])
+
+
+def detect_dnn(rgb: np.ndarray, gray: np.ndarray) -> List[Box]:
+    """OpenCV DNN (res10 SSD style) detector: close to HOG accuracy, faster on CPU."""
+    import cv2
+
+    global _dnn_net
+    if _dnn_net is None:
+        if not FACE_DNN_MODEL:
+            raise RuntimeError("FACE_DETECTOR=dnn requires FACE_DNN_MODEL")
+        _dnn_net = cv2.dnn.readNet(FACE_DNN_MODEL, FACE_DNN_CONFIG)
+    height, width = rgb.shape[:2]
+    # The res10 model was trained on BGR means; swapRB turns our RGB back
+    blob = cv2.dnn.blobFromImage(rgb, 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=True)
+    _dnn_net.setInput(blob)
+    detections = _dnn_net.forward().reshape(-1, 7)
+    boxes = []
+    for _, _, confidence, x1, y1, x2, y2 in detections:
+        if confidence < FACE_DNN_CONFIDENCE:
+            continue
+        left, top = max(int(x1 * width), 0), max(int(y1 * height), 0)
+        right, bottom = min(int(x2 * width), width - 1), min(int(y2 * height), height - 1)
+        if right > left and bottom > top:
+            boxes.append((top, right, bottom, left))
+    return _largest_first(boxes)
+
+
+def encode_dlib(rgb: np.ndarray, box: Box) -> Optional[np.ndarray]:
+    """dlib ResNet encoder, the model every stored encoding comes from."""
+    import face_recognition
+
+    encodings = face_recognition.face_encodings(
+        rgb,
+        known_face_locations=[box],
+        num_jitters=FACE_NUM_JITTERS,
+        model=FACE_LANDMARK_MODEL,
+    )
+    return np.asarray(encodings[0], dtype=np.float32) if encodings else None
+
+
+DETECTORS: Dict[str, Detector] = {
+    "hog": detect_hog,
+    "cnn": detect_cnn,
+    "haar": detect_haar,
+    "dnn": detect_dnn,
+}
+
+ENCODERS: Dict[str, Encoder] = {
+    "dlib": encode_dlib,
+}
+
+
+def get_detector(name: str) -> Detector:
+    try:
+        return DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown face detector {name!r}; expected one of {', '.join(DETECTORS)}")
+
+
+def get_encoder(name: str) -> Encoder:
+    try:
+        return ENCODERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown face encoder {name!r}; expected one of {', '.join(ENCODERS)}")
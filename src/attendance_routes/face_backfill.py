@@ -0,0 +1,86 @@
+"""
+Backfill users.face_encoding for users whose profile picture was uploaded
+before encodings were stored at enrollment time.
+
+    python -m src.attendance_routes.face_backfill [--batch-size 100] [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+
+from src.common_routes.common_checks import (
+    init_supabase_client,
+    close_supabase_client,
+    run_query,
+    apply_keyset,
+    split_page,
+)
+from src.career_routes.career_checks import read_object
+from .attendance_checks import enroll_face, stop_face_pool, FACE_ENCODING_COLUMN
+from .face_index import store_face
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_face_encodings(batch_size: int = 100, dry_run: bool = False) -> dict:
+    supabase = init_supabase_client()
+    stats = {"scanned": 0, "encoded": 0, "no_face": 0, "failed": 0}
+    after = None
+    while True:
+        query = (
+            supabase
+            .table("users")
+            .select("id, user_profile_picture, created_at")
+            .is_(FACE_ENCODING_COLUMN, "null")
+            .not_.is_("user_profile_picture", "null")
+        )
+        res = await run_query(apply_keyset(query, after, batch_size))
+        users, after = split_page(res.data or [], batch_size)
+
+        for user in users:
+            stats["scanned"] += 1
+            try:
+                encoding = await enroll_face(await read_object(user["user_profile_picture"]))
+            except Exception as e:
+                logger.warning("Failed to encode profile picture for user_id=%s: %s", user["id"], e)
+                stats["failed"] += 1
+                continue
+            if encoding is None:
+                stats["no_face"] += 1
+                continue
+            if not dry_run:
+                await run_query(
+                    supabase
+                    .table("users")
+                    .update({FACE_ENCODING_COLUMN: encoding})
+                    .eq("id", user["id"])
+                )
+                # Keep this host's face store in step; the reconcile job covers other hosts
+                await store_face(user["id"], encoding)
+            stats["encoded"] += 1
+
+        logger.info("Backfill progress: %s", stats)
+        if after is None:
+            return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    try:
+        stats = asyncio.run(backfill_face_encodings(args.batch_size, args.dry_run))
+        logger.info("Backfill finished: %s", stats)
+    finally:
+        stop_face_pool()
+        close_supabase_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+1:N face index used by the kiosk identification endpoint and as the
+first place the verification routes look for a user's reference encoding.
+
+Encodings live in a memory-mapped float32 file on local disk, shared by
+every uvicorn worker on the host through the OS page cache. A worker that
+starts up maps the existing file instead of loading every encoding from
+Supabase, and reads rows through zero-copy NumPy views.
+
+    python -m src.attendance_routes.face_index --rebuild
+"""
+import argparse
+import asyncio
+import fcntl
+import os
+import shutil
+import threading
+import time
+import logging
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from src.common_routes.common_checks import get_supabase_client, run_query, apply_keyset, split_page
+from src.common_routes.scheduler import JobScheduler
+from .attendance_setting import FACE_INDEX_LOAD_BATCH, FACE_INDEX_RECONCILE_SECONDS, FACE_STORE_DIR
+from .attendance_checks import FACE_ENCODING_COLUMN
+
+logger = logging.getLogger(__name__)
+
+FACE_DIM = 128
+ROW_BYTES = FACE_DIM * 4
+
+
+class FaceIndex:
+    """
+    On-disk store, one generation directory at a time:
+
+        <directory>/current -> gen-<timestamp>/
+            embeddings.f32   (n, 128) float32 rows, append-only
+            alive.u8         one byte per row, 0 = tombstoned
+            ids.txt          user id of each row, one per line
+
+    ids.txt is written last, so its line count is the number of complete
+    rows. Updates append a row and tombstone the user's previous one;
+    a rebuild writes a new generation and swaps the `current` symlink.
+    Writers serialise on an flock, always taken before the in-process
+    lock; readers never flock, they re-map when the generation changes or
+    rows were appended.
+
+    The store is a per-host cache of users.face_encoding: Supabase is the
+    source of truth, and reconcile_face_index() rebuilds the store when it
+    no longer matches (e.g. after a re-enrollment made on another host).
+
+    Squared row norms are kept per process so a search costs one GEMV
+    over the mapped matrix: |m - p|^2 = |m|^2 - 2 m.p + |p|^2.
+    """
+
+    SYNC_ATTEMPTS = 3
+
+    def __init__(self, directory: str = FACE_STORE_DIR, dim: int = FACE_DIM):
+        self.directory = directory
+        self.dim = dim
+        self._lock = threading.Lock()
+        # Writes made before any store exists, applied once one does
+        self._pending: Dict[str, Optional[np.ndarray]] = {}
+        self._reset(None)
+
+    def _reset(self, generation: Optional[str]) -> None:
+        self._generation = generation
+        self._matrix = np.empty((0, self.dim), dtype=np.float32)
+        self._alive = np.empty(0, dtype=np.uint8)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: dict[str, int] = {}
+        self._ids_offset = 0
+
+    def _file(self, generation: str, name: str) -> str:
+        return os.path.join(generation, name)
+
+    def _current(self) -> Optional[str]:
+        try:
+            generation = os.path.realpath(os.path.join(self.directory, os.readlink(os.path.join(self.directory, "current"))))
+        except FileNotFoundError:
+            return None
+        # A dangling link counts as no store, so it gets rebuilt
+        return generation if os.path.isdir(generation) else None
+
+    def ready(self) -> bool:
+        return self._current() is not None
+
+    @contextmanager
+    def _writer(self, name: str = ".lock", blocking: bool = True):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "a") as lock_file:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def build_lock(self):
+        """
+        Non-blocking cross-process lock so only one worker builds the
+        store from Supabase; yields False if another process holds it.
+        """
+        return self._writer(".build.lock", blocking=False)
+
+    def _sync(self) -> None:
+        """
+        Pick up a new generation or rows appended by any process.
+        Must be called with self._lock held.
+        """
+        for _ in range(self.SYNC_ATTEMPTS):
+            generation = self._current()
+            if generation != self._generation:
+                self._reset(generation)
+            if generation is None:
+                return
+            try:
+                with open(self._file(generation, "ids.txt"), "rb") as f:
+                    f.seek(self._ids_offset)
+                    chunk = f.read()
+                complete = chunk.rfind(b"\n") + 1
+                if not complete:
+                    return
+                new_ids = chunk[:complete].decode("utf-8").splitlines()
+                start = len(self._ids)
+                n = start + len(new_ids)
+                matrix = np.memmap(self._file(generation, "embeddings.f32"), dtype=np.float32, mode="r", shape=(n, self.dim))
+                alive = np.memmap(self._file(generation, "alive.u8"), dtype=np.uint8, mode="r", shape=(n,))
+            except (FileNotFoundError, ValueError) as e:
+                # A rebuild replaced this generation between readlink and
+                # open, or its files are shorter than ids.txt says
+                logger.debug("Face store generation %s unreadable: %s", generation, e)
+                self._reset(None)
+                continue
+
+            self._matrix, self._alive = matrix, alive
+            self._ids_offset += complete
+            added = np.asarray(self._matrix[start:n])
+            self._norms = np.concatenate([self._norms, np.einsum("ij,ij->i", added, added)])
+            for row, user_id in enumerate(new_ids, start):
+                self._rows[user_id] = row
+            self._ids.extend(new_ids)
+            return
+        logger.warning("Face store at %s unreadable; treating it as missing", self.directory)
+        self._reset(None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return int(np.count_nonzero(self._alive))
+
+    def get(self, user_id: str) -> Optional[np.ndarray]:
+        """
+        Zero-copy view of the user's encoding, or None if not indexed.
+        """
+        with self._lock:
+            self._sync()
+            row = self._rows.get(user_id)
+            if row is None or not self._alive[row]:
+                return None
+            return np.asarray(self._matrix[row])
+
+    def snapshot(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Copies of the live user ids and their encodings.
+        """
+        with self._lock:
+            self._sync()
+            live = np.flatnonzero(self._alive)
+            return [self._ids[row] for row in live], np.asarray(self._matrix[live])
+
+    def _replace_all_locked(self, user_ids: List[str], encodings: np.ndarray) -> None:
+        """
+        Write a fresh generation and switch every process over to it.
+        Must be called with the writer flock held.
+        """
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        generation = os.path.join(self.directory, f"gen-{time.time_ns()}")
+        os.makedirs(generation)
+        encodings.tofile(self._file(generation, "embeddings.f32"))
+        np.ones(len(user_ids), dtype=np.uint8).tofile(self._file(generation, "alive.u8"))
+        with open(self._file(generation, "ids.txt"), "w", encoding="utf-8") as f:
+            f.writelines(f"{user_id}\n" for user_id in user_ids)
+
+        link = os.path.join(self.directory, "current")
+        tmp_link = f"{link}.{os.getpid()}"
+        os.symlink(os.path.basename(generation), tmp_link)
+        os.replace(tmp_link, link)
+
+        # Mapped pages of old generations stay valid after unlinking
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("gen-") and path != generation:
+                shutil.rmtree(path, ignore_errors=True)
+        logger.info("Face store written with %d users at %s", len(user_ids), generation)
+
+    def replace_all(self, user_ids: List[str], encodings: np.ndarray) -> None:
+        with self._writer():
+            self._replace_all_locked(user_ids, encodings)
+            self._apply_locked({})
+
+    def _tombstone(self, generation: str, row: int) -> None:
+        with open(self._file(generation, "alive.u8"), "r+b") as f:
+            f.seek(row)
+            f.write(b"\x00")
+
+    def _dead_rows(self) -> int:
+        return len(self._ids) - int(np.count_nonzero(self._alive))
+
+    def _apply_locked(self, writes: Dict[str, Optional[np.ndarray]]) -> bool:
+        """
+        Apply queued writes plus `writes` ({user_id: vector, or None to
+        remove}). Must be called with the writer flock held. Returns True
+        when enough rows are tombstoned that compact() is worth running.
+        """
+        with self._lock:
+            self._sync()
+            if self._generation is None:
+                # No store yet; applied once the build publishes one
+                self._pending.update(writes)
+                return False
+            writes, self._pending = {**self._pending, **writes}, {}
+
+        for user_id, vector in writes.items():
+            with self._lock:
+                self._sync()
+                generation, n, ids_end = self._generation, len(self._ids), self._ids_offset
+                row = self._rows.get(user_id)
+                alive = row is not None and bool(self._alive[row])
+            if alive:
+                self._tombstone(generation, row)
+            if vector is None:
+                continue
+            # Drop any partial row left by a writer that crashed mid-append
+            with open(self._file(generation, "embeddings.f32"), "r+b") as f:
+                f.truncate(n * ROW_BYTES)
+                f.seek(0, os.SEEK_END)
+                f.write(vector.tobytes())
+            with open(self._file(generation, "alive.u8"), "r+b") as f:
+                f.truncate(n)
+                f.seek(0, os.SEEK_END)
+                f.write(b"\x01")
+            with open(self._file(generation, "ids.txt"), "r+b") as f:
+                # Likewise a partial last line, or the id would be glued to it
+                f.truncate(ids_end)
+                f.seek(0, os.SEEK_END)
+                f.write(f"{user_id}\n".encode("utf-8"))
+
+        with self._lock:
+            self._sync()
+            return self._dead_rows() > max(1024, len(self._ids) // 2)
+
+    def upsert(self, user_id: str, encoding) -> bool:
+        """
+        Blocking file I/O under the writer flock; async code should use
+        store_face(). Returns True if the store should be compacted.
+        """
+        vector = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+        with self._writer():
+            return self._apply_locked({user_id: vector})
+
+    def remove(self, user_id: str) -> bool:
+        with self._writer():
+            return self._apply_locked({user_id: None})
+
+    def apply_pending(self) -> bool:
+        """
+        Apply writes queued before the store existed, if it now does.
+        """
+        if not self._pending:
+            return False
+        with self._writer():
+            return self._apply_locked({})
+
+    def compact(self) -> None:
+        """
+        Rewrite the store without tombstoned rows. The flock is held from
+        reading the live rows until the new generation is published, so
+        no concurrent write falls in between.
+        """
+        with self._writer():
+            user_ids, encodings = self.snapshot()
+            self._replace_all_locked(user_ids, encodings)
+
+    def search(self, probe: np.ndarray, k: int = 1) -> List[Tuple[str, float]]:
+        """
+        Returns the k nearest live users as (user_id, distance), closest first.
+        """
+        probe = np.asarray(probe, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            self._sync()
+            matrix, alive, norms, ids = self._matrix, self._alive, self._norms, self._ids
+            n = len(ids)
+        if n == 0:
+            return []
+        d2 = norms[:n] - 2.0 * (np.asarray(matrix[:n]) @ probe) + float(probe @ probe)
+        d2[np.asarray(alive[:n]) == 0] = np.inf
+        k = min(k, int(np.count_nonzero(np.isfinite(d2))))
+        if k == 0:
+            return []
+        top = np.argpartition(d2, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(d2[top])][:k]
+        distances = np.sqrt(np.maximum(d2[top], 0.0))
+        return [(ids[i], float(d)) for i, d in zip(top, distances)]
+
+
+face_index = FaceIndex()
+_load_lock: Optional[asyncio.Lock] = None
+_compaction: Optional[asyncio.Task] = None
+
+
+def _compact_in_background() -> None:
+    global _compaction
+    if _compaction is not None and not _compaction.done():
+        return
+    _compaction = asyncio.create_task(asyncio.to_thread(face_index.compact))
+    _compaction.add_done_callback(
+        lambda t: t.cancelled() or t.exception() is None or logger.error("Face store compaction failed: %s", t.exception())
+    )
+
+
+async def store_face(user_id: str, encoding) -> None:
+    """
+    Add or replace a user's encoding without blocking the event loop.
+    """
+    if await asyncio.to_thread(face_index.upsert, user_id, encoding):
+        _compact_in_background()
+
+
+async def drop_face(user_id: str) -> None:
+    if await asyncio.to_thread(face_index.remove, user_id):
+        _compact_in_background()
+
+
+async def fetch_face_encodings() -> Tuple[List[str], np.ndarray]:
+    """
+    Every user with a stored face encoding, read from Supabase.
+    """
+    supabase = get_supabase_client()
+    user_ids: List[str] = []
+    encodings: List[List[float]] = []
+    after = None
+    while True:
+        query = (
+            supabase
+            .table("users")
+            .select(f"id, created_at, {FACE_ENCODING_COLUMN}")
+            .not_.is_(FACE_ENCODING_COLUMN, "null")
+        )
+        res = await run_query(apply_keyset(query, after, FACE_INDEX_LOAD_BATCH))
+        rows, after = split_page(res.data or [], FACE_INDEX_LOAD_BATCH)
+        for row in rows:
+            encoding = row.get(FACE_ENCODING_COLUMN)
+            if encoding and len(encoding) == FACE_DIM:
+                user_ids.append(row["id"])
+                encodings.append(encoding)
+        if after is None:
+            return user_ids, np.asarray(encodings, dtype=np.float32).reshape(-1, FACE_DIM)
+
+
+async def load_face_index() -> int:
+    """
+    (Re)build the store from every user with a stored face encoding.
+    """
+    user_ids, matrix = await fetch_face_encodings()
+    await asyncio.to_thread(face_index.replace_all, user_ids, matrix)
+    return len(user_ids)
+
+
+def _store_matches(user_ids: List[str], encodings: np.ndarray) -> bool:
+    stored_ids, stored = face_index.snapshot()
+    if len(stored_ids) != len(user_ids) or set(stored_ids) != set(user_ids):
+        return False
+    order = {user_id: i for i, user_id in enumerate(stored_ids)}
+    rows = [order[user_id] for user_id in user_ids]
+    return bool(np.allclose(stored[rows], encodings, atol=1e-6))
+
+
+async def reconcile_face_index() -> dict:
+    """
+    Compare the host's store with users.face_encoding and rebuild it if
+    they differ, so re-enrollments and deletions made through another host
+    (or while this one was down) take effect here.
+    """
+    if not face_index.ready():
+        # Nothing to compare with: build it (or wait for the worker that is)
+        await ensure_face_index()
+        return {"users": len(face_index), "rebuilt": True}
+    user_ids, matrix = await fetch_face_encodings()
+    if await asyncio.to_thread(_store_matches, user_ids, matrix):
+        return {"users": len(user_ids), "rebuilt": False}
+    logger.info("Face store out of date with Supabase; rebuilding")
+    await asyncio.to_thread(face_index.replace_all, user_ids, matrix)
+    return {"users": len(user_ids), "rebuilt": True}
+
+
+def register_face_index_jobs(scheduler: JobScheduler) -> None:
+    # The store is shared by the workers of a host: one of them reconciles
+    scheduler.add("reconcile_face_index", FACE_INDEX_RECONCILE_SECONDS, reconcile_face_index, exclusive=True)
+
+
+async def warm_face_index() -> None:
+    """
+    Startup preload so the first kiosk scan doesn't wait for the build.
+    Failures are left for the first request to retry.
+    """
+    try:
+        await ensure_face_index()
+    except Exception as e:
+        logger.warning("Face index preload failed: %s", e)
+
+
+async def ensure_face_index() -> FaceIndex:
+    """
+    Map the shared store, building it from Supabase if no worker has yet.
+    One process builds; the others wait for its generation to appear.
+    """
+    global _load_lock
+    if face_index.ready():
+        return face_index
+    if _load_lock is None:
+        _load_lock = asyncio.Lock()
+    async with _load_lock:
+        while not face_index.ready():
+            with face_index.build_lock() as acquired:
+                if acquired:
+                    if not face_index.ready():
+                        await load_face_index()
+                    break
+            await asyncio.sleep(0.2)
+    # Writes queued in this process while another one was building
+    if await asyncio.to_thread(face_index.apply_pending):
+        _compact_in_background()
+    return face_index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the store from the users table")
+    parser.add_argument("--compact", action="store_true", help="drop tombstoned rows")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    if args.rebuild:
+        logger.info("Rebuilt face store with %d users", asyncio.run(load_face_index()))
+    if args.compact:
+        face_index.compact()
+    logger.info("Face store at %s: %d live users", face_index.directory, len(face_index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Functions that run inside the face recognition worker processes.
+Kept free of app imports so spawned workers start quickly.
+
+cv2, PIL and face_recognition (dlib) are imported inside the functions:
+the API process imports this module only to hand its functions to the
+pool, and must not pay the vision stack's import time and memory.
+"""
+import io
+import os
+import time
+import numpy as np
+from typing import Optional
+from .attendance_setting import (
+    FACE_MAX_DIMENSION,
+    FACE_MIN_BRIGHTNESS,
+    FACE_MIN_SHARPNESS,
+    FACE_DETECTOR,
+    FACE_ENCODER,
+)
+from .face_backends import get_detector, get_encoder
+
+
+def warm_up() -> None:
+    """
+    Pool initializer: loads the vision stack and dlib models in the worker;
+    one tiny detection also loads/warms the configured detector before
+    real traffic.
+    """
+    get_encoder(FACE_ENCODER)
+    get_detector(FACE_DETECTOR)(np.zeros((32, 32, 3), dtype=np.uint8), np.zeros((32, 32), dtype=np.uint8))
+
+
+def ping() -> int:
+    return os.getpid()
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _decode_flag(content: bytes) -> int:
+    """
+    Picks a reduced decode mode from the image header, so a 12MP JPEG is
+    decoded straight to 1/2, 1/4 or 1/8 scale (DCT scaling) instead of
+    full resolution, while staying at least FACE_MAX_DIMENSION px.
+    """
+    import cv2
+    from PIL import Image
+
+    if not FACE_MAX_DIMENSION:
+        return cv2.IMREAD_COLOR
+    try:
+        with Image.open(io.BytesIO(content)) as header:
+            longest = max(header.size)
+    except Exception:
+        return cv2.IMREAD_COLOR
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if longest // factor >= FACE_MAX_DIMENSION:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def preprocess(content: bytes, timings: dict) -> tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Decodes with OpenCV, downscales to FACE_MAX_DIMENSION and converts
+    colour space once. Returns (rgb, gray), or (None, None) if the bytes
+    are not an image.
+    """
+    import cv2
+
+    start = time.perf_counter()
+    bgr = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), _decode_flag(content))
+    timings["decode"] = _elapsed_ms(start)
+    if bgr is None:
+        return None, None
+
+    start = time.perf_counter()
+    height, width = bgr.shape[:2]
+    scale = FACE_MAX_DIMENSION / max(height, width) if FACE_MAX_DIMENSION else 1.0
+    if scale < 1.0:
+        bgr = cv2.resize(bgr, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    timings["resize"] = _elapsed_ms(start)
+    return rgb, gray
+
+
+def quality_error(gray: np.ndarray, timings: dict) -> Optional[str]:
+    """
+    Cheap checks that reject dark or blurry frames before dlib runs.
+    """
+    import cv2
+
+    start = time.perf_counter()
+    error = None
+    if FACE_MIN_BRIGHTNESS and float(gray.mean()) < FACE_MIN_BRIGHTNESS:
+        error = "Uploaded image is too dark"
+    elif FACE_MIN_SHARPNESS and float(cv2.Laplacian(gray, cv2.CV_64F).var()) < FACE_MIN_SHARPNESS:
+        error = "Uploaded image is too blurry"
+    timings["quality"] = _elapsed_ms(start)
+    return error
+
+
+def analyze_face(
+    content: bytes,
+    quality_gate: bool = True,
+    detector: str = FACE_DETECTOR,
+    encoder: str = FACE_ENCODER,
+) -> dict:
+    """
+    Full pipeline: pre-process, quality gate, detect, encode.
+    Returns {"encoding": float32 array or None, "error": str or None,
+    "timings_ms": per-stage milliseconds}. Stops at the first failing stage.
+    Backends default to the FACE_DETECTOR/FACE_ENCODER settings.
+    """
+    timings: dict = {}
+    result = {"encoding": None, "error": None, "timings_ms": timings}
+
+    rgb, gray = preprocess(content, timings)
+    if rgb is None:
+        result["error"] = "Uploaded image could not be decoded"
+        return result
+
+    if quality_gate:
+        result["error"] = quality_error(gray, timings)
+        if result["error"]:
+            return result
+
+    start = time.perf_counter()
+    locations = get_detector(detector)(rgb, gray)
+    timings["detect"] = _elapsed_ms(start)
+    if not locations:
+        result["error"] = "No face detected in the uploaded image"
+        return result
+
+    # Landmarks and the ResNet encoder, the expensive part, run last
+    start = time.perf_counter()
+    encoding = get_encoder(encoder)(rgb, locations[0])
+    timings["encode"] = _elapsed_ms(start)
+    if encoding is None:
+        result["error"] = "No face detected in the uploaded image"
+        return result
+
+    result["encoding"] = encoding
+    return result
+
+
+def encode_face(content: bytes) -> Optional[np.ndarray]:
+    """
+    Returns the 128-d float32 encoding of the largest face in the image,
+    or None if no face is found. Used for enrollment, so no quality gate.
+    """
+    return analyze_face(content, quality_gate=False)["encoding"]
@@ -0,0 +1,213 @@
+"""
+Attendance punches (check-in/check-out) recorded when a face verification
+succeeds, written to Supabase through an in-process write-behind buffer.
+
+A burst of check-ins costs a few bulk inserts instead of one round trip per
+employee. Punches not yet flushed are lost if the process dies, so the loss
+window is at most PUNCH_FLUSH_INTERVAL_MS or PUNCH_FLUSH_RECORDS punches;
+a normal shutdown flushes everything.
+
+Failed inserts are retried only when the failure is transient (network,
+timeout, 5xx). A row PostgREST rejects (constraint violation, bad value)
+is isolated by halving the chunk, written to the dead-letter log and
+skipped, so it cannot hold up the punches queued behind it.
+
+Schema:
+
+    CREATE TABLE attendance_punches (
+        id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        punch_type text NOT NULL CHECK (punch_type IN ('in', 'out')),
+        punched_at timestamptz NOT NULL,
+        distance real,
+        device text,
+        created_at timestamptz NOT NULL DEFAULT now()
+    );
+    CREATE INDEX ON attendance_punches (punched_at);
+    CREATE INDEX ON attendance_punches (created_at, id);
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from postgrest.exceptions import APIError
+from src.common_routes.common_checks import get_supabase_client, run_query
+from .attendance_setting import PUNCH_FLUSH_RECORDS, PUNCH_FLUSH_INTERVAL_MS, PUNCH_BUFFER_MAX
+
+logger = logging.getLogger(__name__)
+# Punches that can never be inserted, one JSON row per record
+dead_letter_logger = logging.getLogger(f"{__name__}.dead_letter")
+
+PUNCH_TABLE = "attendance_punches"
+PUNCH_TYPES = ("in", "out")
+# Rows per insert request when draining a backlog
+PUNCH_INSERT_CHUNK = 500
+
+
+def is_rejected_insert(error: Exception) -> bool:
+    """
+    True when PostgREST refused the rows themselves (constraint violation,
+    invalid value, unknown column): retrying can never succeed. Network
+    errors, timeouts, 5xx and auth or permission errors are transient.
+    """
+    if not isinstance(error, APIError):
+        return False
+    code = str(error.code or "")
+    if code.isdigit() and len(code) == 3:
+        # HTTP status of a response without a PostgREST error body
+        return 400 <= int(code) < 500 and int(code) not in (401, 403, 408, 429)
+    if code == "42501":  # insufficient privilege: fix the grants, then retry
+        return False
+    return code[:2] in ("22", "23", "42") or code.startswith(("PGRST1", "PGRST2"))
+
+
+class PunchBuffer:
+    def __init__(
+        self,
+        flush_records: int = PUNCH_FLUSH_RECORDS,
+        flush_interval_ms: int = PUNCH_FLUSH_INTERVAL_MS,
+        max_buffered: int = PUNCH_BUFFER_MAX,
+    ):
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_buffered = max_buffered
+        self._pending: List[dict] = []
+        # Batch taken by a flush that is still inserting it
+        self._flushing: List[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                "Punch buffer started (flush every %d records or %d ms)",
+                self.flush_records, int(self.flush_interval * 1000),
+            )
+
+    async def stop(self) -> None:
+        """
+        Stop the flusher and write out everything still buffered. The
+        flusher is asked to exit rather than cancelled, so an insert in
+        flight is never interrupted.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error("Dropping %d unflushed attendance punches on shutdown", len(self._pending))
+
+    def pending_between(self, start: float, end: float) -> int:
+        """
+        Punches not yet written whose punched_at lies in [start, end)
+        (epoch seconds), including those of a flush in progress.
+        """
+        return sum(
+            start <= datetime.fromisoformat(punch["punched_at"]).timestamp() < end
+            for punch in self._pending + self._flushing
+        )
+
+    def _trim(self) -> None:
+        if len(self._pending) > self.max_buffered:
+            dropped = len(self._pending) - self.max_buffered
+            del self._pending[:dropped]
+            logger.error("Punch buffer full; dropped %d oldest punches", dropped)
+
+    def add(self, record: dict) -> None:
+        self._pending.append(record)
+        self._trim()
+        if self._task is None:
+            # No lifespan (e.g. scripts): start lazily on the running loop
+            self.start()
+        if len(self._pending) >= self.flush_records:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Bulk insert everything buffered. On a transient failure the unsent
+        rows are put back in front of newer punches and retried on the next
+        tick; rejected rows are dead-lettered and the rest carry on.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            self._flushing = batch
+            # Rows written or dead-lettered, always a prefix of the batch
+            sent = 0
+            size = PUNCH_INSERT_CHUNK
+            try:
+                supabase = get_supabase_client()
+                while sent < len(batch):
+                    chunk = batch[sent:sent + size]
+                    try:
+                        await run_query(supabase.table(PUNCH_TABLE).insert(chunk))
+                        size = min(size * 2, PUNCH_INSERT_CHUNK)
+                    except Exception as e:
+                        if not is_rejected_insert(e):
+                            raise
+                        if len(chunk) > 1:
+                            # Halve until the rejected row is alone at the front
+                            size = (len(chunk) + 1) // 2
+                            continue
+                        self.rejected += 1
+                        dead_letter_logger.error("Attendance punch rejected (%s): %s", e, json.dumps(chunk[0], default=str))
+                    sent += len(chunk)
+            except Exception as e:
+                unsent = batch[sent:]
+                logger.error("Failed to flush %d attendance punches: %s", len(unsent), e)
+                self._pending = unsent + self._pending
+                self._trim()
+            except asyncio.CancelledError:
+                # Keep the unsent rows for the next flush; a chunk cut off
+                # mid-insert may be written twice rather than lost
+                self._pending = batch[sent:] + self._pending
+                self._trim()
+                raise
+            finally:
+                self._flushing = []
+            return sent
+
+
+punch_buffer = PunchBuffer()
+
+
+def record_punch(result: dict, user_id: str, punch_type: str, device: Optional[str]) -> dict:
+    """
+    Queue a punch if the verification result matched, and attach it to
+    the result. Non-matching results are returned untouched.
+    """
+    if not result.get("matched") or not user_id:
+        return result
+    punch = {
+        "user_id": user_id,
+        "punch_type": punch_type,
+        "punched_at": datetime.now(timezone.utc).isoformat(),
+        "distance": result.get("distance"),
+        "device": device,
+    }
+    punch_buffer.add(punch)
+    result["punch"] = punch
+    return result
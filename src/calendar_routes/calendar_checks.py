@@ -1,17 +1,24 @@
 import httpx
-from .calendar_setting import HOLIDAY_PROXY_URL, HOLIDAY_TARGET_URL
+import asyncio
+import logging
+import time
+from .calendar_setting import HOLIDAY_PROXY_URL, HOLIDAY_TARGET_URL, HOLIDAY_CACHE_TTL_SECONDS
 from fastapi import HTTPException,status
+from supabase import Client
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from src.common_routes.common_checks import run_query, http_request, ResponseCache
 import json
 
+logger = logging.getLogger(__name__)
+
 async def get_year_holidays(year: int):
     try:
         # Construct the URL to fetch holidays for the given year
         url = f"{HOLIDAY_PROXY_URL}{HOLIDAY_TARGET_URL}{year}"
-        print(f"Fetching holidays from: {url}")
+        logger.info("Fetching holidays from: %s", url)
         
-        # Send an asynchronous GET request
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=60)
+        # Send the GET through the shared pooled client (retried on failure)
+        response = await http_request("GET", url, timeout=60)
 
         # Check if the response is successful
         if response.status_code != 200:
@@ -54,3 +61,171 @@ async def get_year_holidays(year: int):
         # Catch any other errors
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+
+class HolidayCache:
+    """
+    Holiday rows per year, kept in memory because they change a few times
+    a year. Loads are single-flight: while one coroutine loads a year,
+    other callers for that year await the same result. invalidate() bumps
+    the year's version so a load that raced with a write isn't stored.
+    Write routes only invalidate their own worker's cache, so a year is
+    also re-read once it is older than `ttl` seconds; a re-read that finds
+    the same rows keeps the cached list.
+    """
+
+    def __init__(self, ttl: float = HOLIDAY_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._years: Dict[int, List[dict]] = {}
+        self._loaded_at: Dict[int, float] = {}
+        self._versions: Dict[int, int] = {}
+        self._inflight: Dict[int, asyncio.Task] = {}
+
+    def get(self, year: int) -> Optional[List[dict]]:
+        return self._years.get(year)
+
+    def years(self) -> List[int]:
+        return list(self._years)
+
+    def refresh(self, year: int, rows: List[dict]) -> bool:
+        """
+        Replace a year's rows with a fresh read; False if nothing changed.
+        """
+        self._loaded_at[year] = time.monotonic()
+        if self._years.get(year) == rows:
+            return False
+        self._versions[year] = self._versions.get(year, 0) + 1
+        self._years[year] = rows
+        return True
+
+    def invalidate(self, years: Optional[Iterable[int]] = None) -> None:
+        """
+        Drop the given years, or every year when None.
+        """
+        years = list(self._years.keys() | self._versions.keys()) if years is None else list(years)
+        for year in years:
+            self._years.pop(year, None)
+            self._loaded_at.pop(year, None)
+            self._versions[year] = self._versions.get(year, 0) + 1
+        logger.debug("Holiday cache invalidated for %s", years)
+
+    async def load(self, year: int, loader: Callable[[], Awaitable[List[dict]]]) -> List[dict]:
+        cached = self._years.get(year)
+        if cached is not None and time.monotonic() - self._loaded_at[year] <= self.ttl:
+            return cached
+        task = self._inflight.get(year)
+        if task is None:
+            # Own task, so a caller that disconnects doesn't cancel the others
+            task = asyncio.create_task(self._fill(year, loader))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[year] = task
+        return await asyncio.shield(task)
+
+    async def _fill(self, year: int, loader: Callable[[], Awaitable[List[dict]]]) -> List[dict]:
+        version = self._versions.get(year, 0)
+        try:
+            rows = await loader()
+            # A year with no rows isn't stored yet: keep asking the loader
+            if rows and self._versions.get(year, 0) == version:
+                if rows == self._years.get(year):
+                    rows = self._years[year]
+                self._years[year] = rows
+                self._loaded_at[year] = time.monotonic()
+            return rows
+        finally:
+            self._inflight.pop(year, None)
+
+
+holiday_cache = HolidayCache()
+# Serialized GET /calendar/holidays/{year} bodies, keyed by year
+holiday_responses = ResponseCache("holidays")
+
+
+def invalidate_holidays(years: Optional[Iterable[int]] = None) -> None:
+    """
+    Called by the holiday write routes; None invalidates every year.
+    """
+    years = None if years is None else list(years)
+    holiday_cache.invalidate(years)
+    if years is None:
+        holiday_responses.bump()
+    for year in years or []:
+        holiday_responses.bump(year)
+
+
+def refresh_holidays(year: int, rows: List[dict]) -> bool:
+    """
+    Store a fresh read of a year, e.g. to pick up edits made through
+    another worker. Returns True if the cached rows changed.
+    """
+    if not holiday_cache.refresh(year, rows):
+        return False
+    holiday_responses.bump(year)
+    return True
+
+
+def holiday_years(rows: Iterable[dict]) -> Set[int]:
+    return {int(row["year"]) for row in rows if row.get("year") is not None}
+
+
+async def select_year_holidays(supabase: Client, year: int) -> List[dict]:
+    """
+    Holidays of a year stored in holidays_calendar; empty if the year
+    isn't stored yet. Never calls the external API.
+    """
+    holidays = await run_query(supabase.table("holidays_calendar").select("*").eq("year", year))
+
+    # Handle database query failure
+    if getattr(holidays, "error", None):
+        logger.error("Failed to get holiday calendar: %s", holidays.error)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get holiday calendar from database"
+        )
+    return holidays.data or []
+
+
+async def load_year_holidays(supabase: Client, year: int) -> List[dict]:
+    """
+    Holidays of a year from holidays_calendar. A year that isn't stored
+    yet is fetched from the external API and inserted first.
+    """
+    stored = await select_year_holidays(supabase, year)
+    if stored:
+        return stored
+
+    logger.info("No holidays found in the database for the year %d. Fetching from external API.", year)
+
+    # Fetch holidays from the external API
+    fetched_holidays = await get_year_holidays(year)
+
+    # If no holidays are fetched from the external API, raise an error
+    if not fetched_holidays:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No holidays found for the given year from the external API"
+        )
+
+    # Insert the fetched holidays into the database
+    insert_response = await run_query(supabase.table("holidays_calendar").insert(fetched_holidays))
+
+    # Handle insert failure
+    if getattr(insert_response, "error", None):
+        logger.error("Failed to insert holidays: %s", insert_response.error)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to insert holiday data into database"
+        )
+
+    logger.info("Successfully inserted %d holidays into the database for the year %d.", len(fetched_holidays), year)
+
+    # Re-fetch the holidays after insertion to return the stored rows
+    holidays = await run_query(supabase.table("holidays_calendar").select("*").eq("year", year))
+
+    # Handle re-fetch failure
+    if getattr(holidays, "error", None):
+        logger.error("Failed to get holiday calendar after insertion: %s", holidays.error)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch holiday calendar after insertion"
+        )
+    return holidays.data
@@ -0,0 +1,68 @@
+"""
+Periodic holiday jobs run by the in-process scheduler.
+"""
+import logging
+from datetime import date
+from typing import Dict, List, Union
+
+from fastapi import HTTPException
+from src.common_routes.common_checks import get_supabase_client
+from src.common_routes.scheduler import JobScheduler
+from .calendar_checks import holiday_cache, load_year_holidays, select_year_holidays, refresh_holidays
+from .calendar_setting import (
+    HOLIDAY_PREFETCH_YEARS,
+    HOLIDAY_PREFETCH_INTERVAL_SECONDS,
+    HOLIDAY_REFRESH_INTERVAL_SECONDS,
+)
+from .working_days import working_calendar
+
+logger = logging.getLogger(__name__)
+
+
+def upcoming_years() -> List[int]:
+    this_year = date.today().year
+    return list(range(this_year, this_year + HOLIDAY_PREFETCH_YEARS + 1))
+
+
+async def prefetch_holidays() -> Dict[int, Union[int, str]]:
+    """
+    Store the current and upcoming years' holidays, fetching them from the
+    external API if missing. Returns rows per year, or why a year failed
+    (the API usually has nothing for a year until late in the previous one).
+    """
+    supabase = get_supabase_client()
+    result: Dict[int, Union[int, str]] = {}
+    for year in upcoming_years():
+        try:
+            rows = await holiday_cache.load(year, lambda year=year: load_year_holidays(supabase, year))
+            result[year] = len(rows)
+        except HTTPException as e:
+            logger.warning("Holiday prefetch for %d failed: %s", year, e.detail)
+            result[year] = e.detail
+    return result
+
+
+async def refresh_holiday_caches() -> Dict[str, List[int]]:
+    """
+    Re-read every cached year plus the upcoming ones in this worker, so
+    edits made through other workers show up, and rebuild the working-day
+    calendar for them. Never calls the external API.
+    """
+    supabase = get_supabase_client()
+    refreshed = []
+    for year in sorted(set(holiday_cache.years()) | set(upcoming_years())):
+        rows = await select_year_holidays(supabase, year)
+        if not rows:
+            continue
+        if refresh_holidays(year, rows):
+            refreshed.append(year)
+        await working_calendar.ensure_years(year, year)
+    return {"refreshed": refreshed}
+
+
+def register_calendar_jobs(scheduler: JobScheduler) -> None:
+    # Inserts into holidays_calendar: one worker only
+    scheduler.add("prefetch_holidays", HOLIDAY_PREFETCH_INTERVAL_SECONDS, prefetch_holidays, exclusive=True)
+    # Per-process caches: every worker. Delayed so the first run finds the
+    # years the prefetch has just stored.
+    scheduler.add("refresh_holiday_caches", HOLIDAY_REFRESH_INTERVAL_SECONDS, refresh_holiday_caches, initial_delay=30)
@@ -1,11 +1,14 @@
-from fastapi import FastAPI, APIRouter,HTTPException,Depends,Request,status,Query
+from fastapi import FastAPI, APIRouter,HTTPException,Depends,Request,status,Query,Header
 from .calendar_setting import HOLIDAY_PROXY_URL, HOLIDAY_TARGET_URL
-from src.common_routes.common_checks import get_supabase_client
+from src.common_routes.common_checks import get_supabase_client, run_query
 from src.login.login_checks import get_current_user_id 
 from supabase import Client
-from .calendar_checks import get_year_holidays
-from .calendar_models import HolidayUpdate ,HolidayCreate
-from typing import List
+from .calendar_checks import holiday_cache, holiday_responses, holiday_years, invalidate_holidays, load_year_holidays
+from .calendar_models import HolidayUpdate ,HolidayCreate, WorkingDayRange
+from .calendar_setting import WORKING_DAYS_BATCH_MAX
+from .working_days import working_calendar
+from datetime import date
+from typing import List, Optional
 import json
 import logging
 
@@ -15,59 +18,20 @@ router = APIRouter(prefix="/calendar", tags=["Calendar Main Routes"])
 
 
 @router.get("/holidays/{year}", summary="Get Holidays for a given year")
-async def get_holidays(year: int, supabase: Client = Depends(get_supabase_client),_: str =Depends(get_current_user_id)):
+async def get_holidays(
+    year: int,
+    if_none_match: Optional[str] = Header(None),
+    supabase: Client = Depends(get_supabase_client),_: str =Depends(get_current_user_id)
+):
     try:
-        # Step 1: Fetch holidays from the database
-        holidays = supabase.table("holidays_calendar").select("*").eq("year", year).execute()
-
-        # Handle database query failure
-        if getattr(holidays, "error", None):
-            logger.error("Failed to get holiday calendar: %s", holidays.error)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to get holiday calendar from database"
-            )
-
-        # Step 2: If no holidays are found in the database, fetch from external API
-        if not holidays.data:
-            logger.info("No holidays found in the database for the year %d. Fetching from external API.", year)
-
-            # Fetch holidays from the external API
-            fetched_holidays = await get_year_holidays(year)
-
-            # If no holidays are fetched from the external API, raise an error
-            if not fetched_holidays:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No holidays found for the given year from the external API"
-                )
-
-            # Insert the fetched holidays into the database
-            insert_response = supabase.table("holidays_calendar").insert(fetched_holidays).execute()
-
-            # Handle insert failure
-            if getattr(insert_response, "error", None):
-                logger.error("Failed to insert holidays: %s", insert_response.error)
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to insert holiday data into database"
-                )
-
-            logger.info("Successfully inserted %d holidays into the database for the year %d.", len(fetched_holidays), year)
-
-            # Step 3: Re-fetch the holidays after insertion to return the updated data
-            holidays = supabase.table("holidays_calendar").select("*").eq("year", year).execute()
-
-            # Handle re-fetch failure
-            if getattr(holidays, "error", None):
-                logger.error("Failed to get holiday calendar after insertion: %s", holidays.error)
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to fetch holiday calendar after insertion"
-                )
-
-        # Step 4: Return the holidays data
-        return holidays.data
+        # Served from the per-year cache; a missing year is loaded by one
+        # coroutine while concurrent callers await it. The serialized body
+        # and its ETag are cached too, so a revalidation is a bare 304.
+        return await holiday_responses.respond(
+            year,
+            lambda: holiday_cache.load(year, lambda: load_year_holidays(supabase, year)),
+            if_none_match,
+        )
 
     except HTTPException as e:
         # Catch specific HTTP errors
@@ -107,7 +71,7 @@ async def patch_holidays(
         logger.info("Upserting holidays: %s", data)
 
         # Use upsert exactly as the Supabase docs show
-        response = supabase.table("holidays_calendar").upsert(data).execute()
+        response = await run_query(supabase.table("holidays_calendar").upsert(data))
 
         logger.info("Upsert response: %s", response)
 
@@ -116,6 +80,8 @@ async def patch_holidays(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to update holidays: {response.error}",
             )
+        # Rows keep their year on update; drop every year if none came back
+        invalidate_holidays(holiday_years(response.data or []) or None)
 
         return {
             "message": "Holidays updated successfully",
@@ -153,7 +119,7 @@ async def create_holidays(
         logger.info("Creating holidays: %s", data)
 
         # Insert new holidays
-        response = supabase.table("holidays_calendar").insert(data).execute()
+        response = await run_query(supabase.table("holidays_calendar").insert(data))
 
         logger.info("Insert response: %s", response)
 
@@ -162,6 +128,7 @@ async def create_holidays(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to create holidays: {response.error}",
             )
+        invalidate_holidays(holiday_years(data))
 
         return {
             "message": "Holidays created successfully",
@@ -195,12 +162,11 @@ async def delete_holidays(
         logger.info("Deleting holidays with ids: %s", ids)
 
         # Delete all rows where id is in the list
-        response = (
+        response = await run_query(
             supabase
             .table("holidays_calendar")
             .delete()
             .in_("id", ids)
-            .execute()
         )
 
         logger.info("Delete response: %s", response)
@@ -210,6 +176,7 @@ async def delete_holidays(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to delete holidays: {response.error}",
             )
+        invalidate_holidays(holiday_years(response.data or []) or None)
 
         return {
             "message": f"Successfully deleted {len(ids)} holidays",
@@ -226,4 +193,99 @@ async def delete_holidays(
         )
 
 
+@router.get("/working-days", summary="Count working days between two dates (inclusive)")
+async def count_working_days(
+    start: date = Query(..., description="First day, YYYY-MM-DD"),
+    end: date = Query(..., description="Last day, YYYY-MM-DD"),
+    _: str = Depends(get_current_user_id)
+):
+    try:
+        counts = await working_calendar.count([start], [end])
+        holidays = await working_calendar.holidays_between(start, end)
+        return {
+            "start": start,
+            "end": end,
+            "calendar_days": (end - start).days + 1,
+            "working_days": int(counts[0]),
+            "holidays": holidays,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error counting working days: %s", str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while counting working days",
+        )
+
 
+@router.post("/working-days/batch", summary="Count working days for many date ranges")
+async def count_working_days_batch(
+    payload: List[WorkingDayRange],
+    _: str = Depends(get_current_user_id)
+):
+    try:
+        if not payload:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Payload list cannot be empty",
+            )
+        if len(payload) > WORKING_DAYS_BATCH_MAX:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"At most {WORKING_DAYS_BATCH_MAX} ranges per request",
+            )
+
+        counts = await working_calendar.count([r.start for r in payload], [r.end for r in payload])
+        return [
+            {"start": r.start, "end": r.end, "working_days": int(count)}
+            for r, count in zip(payload, counts)
+        ]
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error counting working days: %s", str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while counting working days",
+        )
+
+
+@router.get("/working-days/next", summary="Working day after a date")
+async def next_working_day(
+    day: date = Query(..., alias="date", description="Reference day, YYYY-MM-DD"),
+    count: int = Query(1, ge=1, le=366, description="Return the count-th working day after the date"),
+    _: str = Depends(get_current_user_id)
+):
+    try:
+        return {"date": day, "count": count, "working_day": await working_calendar.shift(day, count)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error finding next working day: %s", str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while finding the working day",
+        )
+
+
+@router.get("/working-days/previous", summary="Working day before a date")
+async def previous_working_day(
+    day: date = Query(..., alias="date", description="Reference day, YYYY-MM-DD"),
+    count: int = Query(1, ge=1, le=366, description="Return the count-th working day before the date"),
+    _: str = Depends(get_current_user_id)
+):
+    try:
+        return {"date": day, "count": count, "working_day": await working_calendar.shift(day, -count)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error finding previous working day: %s", str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while finding the working day",
+        )
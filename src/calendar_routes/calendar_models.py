@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
+from datetime import date
 
 class HolidayUpdate(BaseModel):
     id: str                     # required to match the row
@@ -16,4 +17,8 @@ class HolidayCreate(BaseModel):
     description: Optional[str] = None
     holiday_type: Optional[str] = None
     year: str
-    
\ No newline at end of file
+
+
+class WorkingDayRange(BaseModel):
+    start: date                    # inclusive
+    end: date                      # inclusive
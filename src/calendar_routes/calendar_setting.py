@@ -3,4 +3,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 HOLIDAY_PROXY_URL = os.getenv("HOLIDAY_PROXY_URL")
-HOLIDAY_TARGET_URL = os.getenv("HOLIDAY_TARGET_URL")
\ No newline at end of file
+HOLIDAY_TARGET_URL = os.getenv("HOLIDAY_TARGET_URL")
+# Working-day calculator, also used by the attendance reports.
+# WEEKEND_DAYS uses Monday=0 ... Sunday=6. Holidays whose holiday_type
+# is listed in NON_WORKING_HOLIDAY_TYPES are days off; leave it empty to
+# treat every holiday in holidays_calendar as a day off.
+WEEKEND_DAYS = tuple(int(d) for d in os.getenv("WEEKEND_DAYS", "5,6").split(",") if d.strip())
+NON_WORKING_HOLIDAY_TYPES = {t.strip().lower() for t in os.getenv("NON_WORKING_HOLIDAY_TYPES", "").split(",") if t.strip()}
+WORKING_DAYS_MAX_YEARS = int(os.getenv("WORKING_DAYS_MAX_YEARS", "10"))
+WORKING_DAYS_BATCH_MAX = int(os.getenv("WORKING_DAYS_BATCH_MAX", "1000"))
+
+# Holiday rows cached per worker are re-read from holidays_calendar after
+# HOLIDAY_CACHE_TTL_SECONDS, so edits made through another worker reach
+# every worker's responses and working-day calendar.
+HOLIDAY_CACHE_TTL_SECONDS = float(os.getenv("HOLIDAY_CACHE_TTL_SECONDS", "30"))
+
+# Background holiday jobs. The prefetch stores the current year and the
+# next HOLIDAY_PREFETCH_YEARS years ahead of time, so no request waits on
+# the external API. The refresh re-reads cached years in every worker.
+HOLIDAY_PREFETCH_YEARS = int(os.getenv("HOLIDAY_PREFETCH_YEARS", "1"))
+HOLIDAY_PREFETCH_INTERVAL_SECONDS = float(os.getenv("HOLIDAY_PREFETCH_INTERVAL_SECONDS", str(6 * 3600)))
+HOLIDAY_REFRESH_INTERVAL_SECONDS = float(os.getenv("HOLIDAY_REFRESH_INTERVAL_SECONDS", "300"))
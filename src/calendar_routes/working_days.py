@@ -0,0 +1,105 @@
+"""
+Working-day calculator over holidays_calendar and the configured weekend.
+
+Each year's days off are kept as a sorted datetime64 array, built from the
+rows held by the per-year holiday cache. Queries run on one NumPy
+busdaycalendar over every loaded year, so counts over many date ranges are
+a single vectorized np.busday_count call. Holiday edits invalidate a year
+in the holiday cache; the next query touching that year rebuilds only that
+year's array and the combined calendar. Years are read from the database
+only: a year that isn't stored yet counts weekends alone until the
+holiday prefetch job stores it.
+"""
+import logging
+import numpy as np
+from datetime import date
+from typing import Dict, List, Sequence
+
+from fastapi import HTTPException, status
+from src.common_routes.common_checks import get_supabase_client
+from .calendar_checks import holiday_cache, select_year_holidays
+from .calendar_setting import WEEKEND_DAYS, NON_WORKING_HOLIDAY_TYPES, WORKING_DAYS_MAX_YEARS
+
+logger = logging.getLogger(__name__)
+
+
+def days_off(rows: List[dict]) -> np.ndarray:
+    """
+    Sorted unique dates of the holidays that are days off.
+    """
+    dates = {
+        row["holiday_date"][:10]
+        for row in rows
+        if row.get("holiday_date")
+        and (not NON_WORKING_HOLIDAY_TYPES or str(row.get("holiday_type") or "").lower() in NON_WORKING_HOLIDAY_TYPES)
+    }
+    return np.array(sorted(dates), dtype="datetime64[D]")
+
+
+class WorkingDayCalendar:
+    def __init__(self, weekend_days: Sequence[int] = WEEKEND_DAYS):
+        self.weekmask = [day not in weekend_days for day in range(7)]
+        # year -> (rows list the array was built from, days off)
+        self._years: Dict[int, tuple] = {}
+        self._holidays = np.empty(0, dtype="datetime64[D]")
+        self._calendar = np.busdaycalendar(weekmask=self.weekmask)
+
+    async def ensure_years(self, first: int, last: int) -> None:
+        """
+        Make sure the calendar reflects the current holidays of every year
+        in [first, last]; rebuilds only years whose rows changed.
+        """
+        if last - first + 1 > WORKING_DAYS_MAX_YEARS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Date ranges may span at most {WORKING_DAYS_MAX_YEARS} years",
+            )
+        changed = []
+        for year in range(first, last + 1):
+            rows = await holiday_cache.load(year, lambda year=year: select_year_holidays(get_supabase_client(), year))
+            seen = self._years.get(year)
+            if seen is None or (seen[0] is not rows and (rows or seen[0])):
+                self._years[year] = (rows, days_off(rows))
+                changed.append(year)
+        if changed:
+            self._holidays = np.concatenate([off for _, off in self._years.values()])
+            self._holidays.sort()
+            self._calendar = np.busdaycalendar(weekmask=self.weekmask, holidays=self._holidays)
+            logger.info("Working-day calendar rebuilt for %s (%d days off loaded)", changed, len(self._holidays))
+
+    async def count(self, starts: Sequence[date], ends: Sequence[date]) -> np.ndarray:
+        """
+        Working days in each inclusive [start, end] range, vectorized.
+        """
+        starts = np.asarray(starts, dtype="datetime64[D]")
+        ends = np.asarray(ends, dtype="datetime64[D]")
+        if np.any(ends < starts):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end must not be before start")
+        await self.ensure_years(starts.min().astype(date).year, ends.max().astype(date).year)
+        return np.busday_count(starts, ends + np.timedelta64(1, "D"), busdaycal=self._calendar)
+
+    async def shift(self, day: date, n: int) -> date:
+        """
+        The n-th working day after `day` (n > 0) or before it (n < 0).
+        Loads further years until the result lies within loaded years.
+        """
+        first = last = day.year
+        while True:
+            await self.ensure_years(first, last)
+            result = np.busday_offset(
+                np.datetime64(day, "D"), n,
+                roll="backward" if n > 0 else "forward",
+                busdaycal=self._calendar,
+            ).astype(date)
+            if first <= result.year <= last:
+                return result
+            first, last = min(first, result.year), max(last, result.year)
+
+    async def holidays_between(self, start: date, end: date) -> List[date]:
+        await self.ensure_years(start.year, end.year)
+        lo = np.searchsorted(self._holidays, np.datetime64(start, "D"), side="left")
+        hi = np.searchsorted(self._holidays, np.datetime64(end, "D"), side="right")
+        return self._holidays[lo:hi].astype(date).tolist()
+
+
+working_calendar = WorkingDayCalendar()
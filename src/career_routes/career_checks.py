@@ -1,64 +1,293 @@
 from minio import Minio
-from .career_settings import MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY, USE_HTTPS,MINIO_BUCKET
+from minio.datatypes import PostPolicy, Object
+from .career_settings import MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY, USE_HTTPS,MINIO_BUCKET, MINIO_REGION
+from .career_settings import MINIO_URL_EXPIRY_SECONDS, MINIO_URL_REFRESH_SECONDS, MINIO_URL_CACHE_SIZE
+from .career_settings import MINIO_UPLOAD_PART_SIZE, MINIO_MAX_UPLOAD_BYTES, MINIO_UPLOAD_URL_EXPIRY_SECONDS
+from .career_settings import MINIO_PUBLIC_ENDPOINT, MINIO_PUBLIC_SECURE
+from fastapi import UploadFile, HTTPException, status
 from minio.error import S3Error 
 import os
 import logging
 logger = logging.getLogger(__name__)
-from datetime import timedelta
+from datetime import timedelta, datetime, timezone
+from collections import OrderedDict
+from typing import Iterable, BinaryIO
+import threading
+import time
+import asyncio
+import uuid
+from src.common_routes.common_checks import ResponseCache
 try : 
     client = Minio(
         MINIO_ENDPOINT,
         access_key=MINIO_ACCESS_KEY,
         secret_key=MINIO_SECRET_KEY,
         secure=False,
+        region=MINIO_REGION,
     )
 except Exception as e:
     logger.error(f"Error initializing Minio client: {e}")
     print("Error initializing Minio client: ", e)
     raise
 
+_bucket_ready = False
 
-async def upload_file(file_path: str, object_name: str | None = None) -> str:
+
+def ensure_bucket() -> bool:
     """
-    Uploads a local file to the MinIO bucket running on your server.
-    Returns the object name used in the bucket.
+    Create MINIO_BUCKET if needed. Called once from the app lifespan so
+    uploads don't pay for bucket_exists/make_bucket on every request.
+    Returns False (and retries on the next upload) if MinIO is unreachable.
     """
+    global _bucket_ready
+    if _bucket_ready:
+        return True
     try:
-        logger.info(f"Uploading file {file_path} to MinIO bucket {MINIO_BUCKET}")
-
-        if object_name is None:
-            object_name = os.path.basename(file_path)
-
-        # Create bucket if it doesn't exist
         if not client.bucket_exists(MINIO_BUCKET):
             client.make_bucket(MINIO_BUCKET)
-
+        _bucket_ready = True
         logger.info(f"Bucket {MINIO_BUCKET} is ready.")
+    except Exception as e:
+        logger.error(f"Error provisioning MinIO bucket {MINIO_BUCKET}: {e}")
+    return _bucket_ready
+
+
+def build_object_name(prefix: str, filename: str | None) -> str:
+    """
+    Unique object name for an upload: <prefix>_<uuid>_<basename>.
+    """
+    return f"{prefix}_{uuid.uuid4().hex}_{os.path.basename(filename or 'file')}"
+
+
+def presign_upload(object_name: str, content_type: str, max_size: int = MINIO_MAX_UPLOAD_BYTES) -> dict:
+    """
+    Presigned POST policy that lets a browser upload one object straight to
+    MinIO. The policy pins the key and Content-Type and caps the size, so
+    the client cannot write anywhere else or upload more than max_size.
+    The client sends `fields` plus a `file` part as multipart/form-data to `url`.
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=MINIO_UPLOAD_URL_EXPIRY_SECONDS)
+    policy = PostPolicy(MINIO_BUCKET, expires_at)
+    policy.add_equals_condition("key", object_name)
+    policy.add_equals_condition("Content-Type", content_type)
+    policy.add_content_length_range_condition(1, max_size)
+    fields = client.presigned_post_policy(policy)
+    fields["key"] = object_name
+    fields["Content-Type"] = content_type
+    return {
+        # The POST policy signature doesn't cover the host, so the browser
+        # can use the public address while the API signs with the internal one
+        "url": f"{'https' if MINIO_PUBLIC_SECURE else 'http'}://{MINIO_PUBLIC_ENDPOINT}/{MINIO_BUCKET}",
+        "fields": fields,
+        "object_name": object_name,
+        "max_size": max_size,
+        "expires_at": expires_at.isoformat(),
+    }
+
+
+async def stat_uploaded_object(object_name: str) -> Object | None:
+    """
+    Returns the object's metadata, or None if nothing was uploaded under
+    that name.
+    """
+    try:
+        return await asyncio.to_thread(client.stat_object, MINIO_BUCKET, object_name)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            return None
+        logger.error(f"Error checking object {object_name}: {e}")
+        raise
+
+
+async def verify_uploaded_object(
+    object_name: str,
+    prefix: str,
+    max_size: int = MINIO_MAX_UPLOAD_BYTES,
+    content_type_prefix: str | None = None,
+) -> Object:
+    """
+    Checks a client-reported object before it is recorded in Supabase:
+    it must carry the expected prefix, exist, and respect the limits.
+    """
+    if not object_name.startswith(f"{prefix}_"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Object does not belong to this upload",
+        )
+    stat = await stat_uploaded_object(object_name)
+    if stat is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded file not found",
+        )
+    if stat.size is not None and stat.size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large (max {max_size} bytes)",
+        )
+    if content_type_prefix and not (stat.content_type or "").startswith(content_type_prefix):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded file has an unexpected content type",
+        )
+    return stat
+
+
+async def read_object(object_name: str) -> bytes:
+    """
+    Reads a whole (small) object from MinIO, e.g. a profile picture.
+    """
+    def _read() -> bytes:
+        response = client.get_object(MINIO_BUCKET, object_name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    return await asyncio.to_thread(_read)
+
+
+class UploadTooLarge(Exception):
+    pass
+
 
-        client.fput_object(
+class _LimitedReader:
+    """
+    File-like wrapper that counts bytes read and stops the upload once
+    more than max_size bytes have come through.
+    """
+
+    def __init__(self, raw: BinaryIO, max_size: int):
+        self._raw = raw
+        self.max_size = max_size
+        self.total = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._raw.read(size)
+        self.total += len(chunk)
+        if self.total > self.max_size:
+            raise UploadTooLarge(f"upload exceeds {self.max_size} bytes")
+        return chunk
+
+
+async def upload_stream(
+    upload: UploadFile,
+    object_name: str,
+    max_size: int = MINIO_MAX_UPLOAD_BYTES,
+    part_size: int = MINIO_UPLOAD_PART_SIZE,
+) -> str:
+    """
+    Streams an UploadFile straight into MinIO with a multipart put_object,
+    without a temp file or reading the whole body into memory. Runs in a
+    worker thread; at most one part is buffered at a time.
+    Raises 413 if the upload is larger than max_size.
+    """
+    if upload.size is not None and upload.size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large (max {max_size} bytes)",
+        )
+    try:
+        logger.info(f"Streaming upload {upload.filename} to MinIO as {object_name}")
+        await asyncio.to_thread(ensure_bucket)
+        await upload.seek(0)
+        reader = _LimitedReader(upload.file, max_size)
+        await asyncio.to_thread(
+            client.put_object,
             bucket_name=MINIO_BUCKET,
             object_name=object_name,
-            file_path=file_path)
-        logger.info(f"File {file_path} uploaded as {object_name} to bucket {MINIO_BUCKET}")
+            data=reader,
+            length=upload.size if upload.size is not None else -1,
+            content_type=upload.content_type or "application/octet-stream",
+            part_size=part_size,
+        )
+        logger.info(f"Uploaded {reader.total} bytes as {object_name} to bucket {MINIO_BUCKET}")
         return object_name
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large (max {max_size} bytes)",
+        )
     except S3Error as e:
         logger.error(f"Error occurred while uploading file: {e}")
         print("Error occurred while uploading file: ", e)
         raise
 
+
+class PresignedUrlCache:
+    """
+    Bounded LRU of presigned GET URLs keyed by object name. An entry is
+    reused until it gets within MINIO_URL_REFRESH_SECONDS of expiring.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, object_name: str, now: float) -> str | None:
+        with self._lock:
+            entry = self._entries.get(object_name)
+            if entry is None:
+                return None
+            url, reuse_until = entry
+            if now >= reuse_until:
+                del self._entries[object_name]
+                return None
+            self._entries.move_to_end(object_name)
+            return url
+
+    def put(self, object_name: str, url: str, reuse_until: float) -> None:
+        with self._lock:
+            self._entries[object_name] = (url, reuse_until)
+            self._entries.move_to_end(object_name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, object_name: str) -> None:
+        with self._lock:
+            self._entries.pop(object_name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+url_cache = PresignedUrlCache(MINIO_URL_CACHE_SIZE)
+
+
+def _sign_get_url(object_name: str, now: float) -> tuple[str, float]:
+    """
+    Sign a GET URL whose request date is floored to the refresh window, so
+    every worker hands out the same URL for an object within that window
+    and browsers/CDNs can cache it. Returns (url, reuse_until).
+    """
+    window = MINIO_URL_REFRESH_SECONDS
+    signed_at = now - (now % window)
+    url = client.get_presigned_url(
+        "GET",
+        bucket_name=MINIO_BUCKET,
+        object_name=object_name,
+        expires=timedelta(seconds=MINIO_URL_EXPIRY_SECONDS),
+        request_date=datetime.fromtimestamp(signed_at, tz=timezone.utc),
+    )
+    return url, signed_at + MINIO_URL_EXPIRY_SECONDS - window
+
+
 async def get_file_url(object_name: str) -> str:
     """
-    Returns a direct URL (works if bucket/object are publicly readable).
+    Returns a presigned GET URL for the object, reusing a cached one
+    until it nears expiry.
     """
     try: 
+        now = time.time()
+        url = url_cache.get(object_name, now)
+        if url is not None:
+            return url
         logger.info(f"Generating presigned URL for object {object_name} in bucket {MINIO_BUCKET}")
-        url = client.get_presigned_url(
-            "GET",
-            bucket_name=MINIO_BUCKET,
-            object_name=object_name,
-            expires=timedelta(days=7)  # URL valid for 7 days
-        )
-        # logger.info(f"Presigned URL generated: {url}")
+        url, reuse_until = _sign_get_url(object_name, now)
+        url_cache.put(object_name, url, reuse_until)
         return url
     except S3Error as e:
         logger.error(f"Error generating presigned URL: {e}")
@@ -66,6 +295,31 @@ async def get_file_url(object_name: str) -> str:
         raise
 
 
+async def get_file_urls(object_names: Iterable[str]) -> dict[str, str]:
+    """
+    Batch version of get_file_url: signs every uncached name in one pass
+    and returns {object_name: url}. Names that fail to sign are omitted.
+    """
+    now = time.time()
+    urls: dict[str, str] = {}
+    missing = 0
+    for object_name in object_names:
+        if not object_name or object_name in urls:
+            continue
+        url = url_cache.get(object_name, now)
+        if url is None:
+            try:
+                url, reuse_until = _sign_get_url(object_name, now)
+            except Exception as e:
+                logger.warning(f"Error generating presigned URL for {object_name}: {e}")
+                continue
+            url_cache.put(object_name, url, reuse_until)
+            missing += 1
+        urls[object_name] = url
+    logger.info(f"Resolved {len(urls)} presigned URLs ({missing} newly signed)")
+    return urls
 
 
-
+# Serialized GET /careers/list/{job_type}/jobs bodies, keyed by job_type;
+# bumped by the job create/update/delete routes
+job_list_responses = ResponseCache("job_lists")
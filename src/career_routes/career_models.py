@@ -79,4 +79,19 @@ class UpdateJobApplications(BaseModel):
     email: Optional[EmailStr] = None
     mobile: Optional[str] = None
     remarks: Optional[str] = None
-    application_status: Optional[str] = "applied"
\ No newline at end of file
+    application_status: Optional[str] = "applied"
+
+
+class UploadUrlRequest(BaseModel):
+    filename: str
+    content_type: str
+
+
+class FinalizeJobApplication(BaseModel):
+    application_data: dict
+    email: EmailStr
+    mobile: str
+    resume_object: str          # object_name returned by the upload_url call
+    remarks: Optional[str] = None
+    recruiter_id: Optional[str] = None
+    application_status: Optional[str] = "applied"
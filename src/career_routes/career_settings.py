@@ -12,7 +12,23 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET")
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")  # pinned so signing never looks up bucket location
 USE_HTTPS = os.getenv("USE_HTTPS", "False").lower()
 LINKEDIN_CLIENT_ID = os.getenv("LINKEDIN_CLIENT_ID")
 LINKEDIN_CLIENT_SECRET = os.getenv("LINKEDIN_CLIENT_SECRET")
-LINKEDIN_COMPANY_URN = os.getenv("LINKEDIN_COMPANY_URN")
\ No newline at end of file
+LINKEDIN_COMPANY_URN = os.getenv("LINKEDIN_COMPANY_URN")
+# Presigned GET URLs: lifetime, re-sign margin before expiry, and LRU size
+MINIO_URL_EXPIRY_SECONDS = int(os.getenv("MINIO_URL_EXPIRY_SECONDS", str(7 * 24 * 3600)))
+MINIO_URL_REFRESH_SECONDS = int(os.getenv("MINIO_URL_REFRESH_SECONDS", str(24 * 3600)))
+MINIO_URL_CACHE_SIZE = int(os.getenv("MINIO_URL_CACHE_SIZE", "10000"))
+# Streaming uploads: multipart part size (min 5 MiB) and hard size cap
+MINIO_UPLOAD_PART_SIZE = int(os.getenv("MINIO_UPLOAD_PART_SIZE", str(5 * 1024 * 1024)))
+MINIO_MAX_UPLOAD_BYTES = int(os.getenv("MINIO_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Lifetime of presigned browser-to-MinIO upload policies
+MINIO_UPLOAD_URL_EXPIRY_SECONDS = int(os.getenv("MINIO_UPLOAD_URL_EXPIRY_SECONDS", "900"))
+# Address browsers use to reach MinIO for presigned uploads, when the API
+# talks to it over an internal host (e.g. files.example.com behind a TLS
+# proxy). https unless MINIO_PUBLIC_SECURE is false; both default to the
+# internal MINIO_ENDPOINT and USE_HTTPS.
+MINIO_PUBLIC_ENDPOINT = os.getenv("MINIO_PUBLIC_ENDPOINT", MINIO_ENDPOINT or "")
+MINIO_PUBLIC_SECURE = os.getenv("MINIO_PUBLIC_SECURE", USE_HTTPS).lower() == "true"
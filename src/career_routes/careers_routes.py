@@ -1,15 +1,17 @@
-from fastapi import FastAPI , APIRouter,HTTPException,Depends,status
+from fastapi import FastAPI , APIRouter,HTTPException,Depends,status,Header
 from .career_models import InternalHiringJobCreate, ExternalHiringJobCreate , JobBase,UpdateJobs,JobApplications,UpdateJobApplications
+from .career_models import UploadUrlRequest, FinalizeJobApplication
 from supabase import create_client, Client
-from src.common_routes.common_checks import get_supabase_client
+from src.common_routes.common_checks import get_supabase_client, run_query, http_request
 from src.login.login_checks import get_current_user_id 
 import logging
 from datetime import date
 from typing import  Optional
 from pydantic import  EmailStr 
 from fastapi import UploadFile, File ,Form
-from .career_checks import upload_file,get_file_url
-import requests
+from .career_checks import upload_stream,get_file_url,get_file_urls
+from .career_checks import build_object_name, presign_upload, verify_uploaded_object, job_list_responses
+import httpx
 from datetime import datetime
 from src.career_routes.career_settings import LINKEDIN_CLIENT_ID, LINKEDIN_CLIENT_SECRET , LINKEDIN_COMPANY_URN
 logger = logging.getLogger(__name__)
@@ -45,18 +47,16 @@ async def create_internal_job(
             "created_by": str(payload.created_by),
         }
         if payload.job_type == 'internal':
-            response = (
+            response = await run_query(
                 supabase
                 .table("internal_hiring_jobs")
                 .insert(data)
-                .execute()
             )  # [web:15]
         elif payload.job_type == 'external':
-            response = (
+            response = await run_query(
                 supabase
                 .table("external_hiring_jobs")
                 .insert(data)
-                .execute()
             )  # [web:15]
 
         if getattr(response, "error", None):
@@ -66,6 +66,7 @@ async def create_internal_job(
                 detail="Failed to create internal job",
             )
 
+        job_list_responses.bump(payload.job_type)
         logger.info("Internal job created successfully: %s", response.data)
         return {
             "message": "Internal job created successfully",
@@ -87,54 +88,41 @@ async def create_internal_job(
 @router.get("/list/{job_type}/jobs", summary="List all internal job postings")
 async def list_external_jobs(
     job_type: str,
+    if_none_match: Optional[str] = Header(None),
     supabase: Client = Depends(get_supabase_client),
     _: str = Depends(get_current_user_id),
 ):
     
     try:
-
-        if job_type == 'external':
-            response = (
-                supabase
-                .table("external_hiring_jobs")
-                .select("*")
-                .execute()
+        if job_type not in ("internal", "external"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid job_type. Use 'internal' or 'external'.",
             )
 
-            if getattr(response, "error", None):
-                logger.error("Failed to fetch external jobs: %s", response.error)
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to fetch external jobs",
-                )
-
-            logger.info("Fetched external jobs successfully")
-            return {
-                "message": "Fetched external jobs successfully",
-                "data": response.data,
-            }
-        
-        elif job_type == 'internal':
-            response = (
+        async def load_jobs():
+            response = await run_query(
                 supabase
-                .table("internal_hiring_jobs")
+                .table(f"{job_type}_hiring_jobs")
                 .select("*")
-                .execute()
             )
 
             if getattr(response, "error", None):
-                logger.error("Failed to fetch internal jobs: %s", response.error)
+                logger.error("Failed to fetch %s jobs: %s", job_type, response.error)
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to fetch internal jobs",
+                    detail=f"Failed to fetch {job_type} jobs",
                 )
 
-            logger.info("Fetched internal jobs successfully")
+            logger.info("Fetched %s jobs successfully", job_type)
             return {
-                "message": "Fetched internal jobs successfully",
+                "message": f"Fetched {job_type} jobs successfully",
                 "data": response.data,
             }
 
+        # Cached body + ETag; unchanged listings are answered with a bare 304
+        return await job_list_responses.respond(job_type, load_jobs, if_none_match)
+
     except HTTPException:
         raise
     except Exception as e:
@@ -173,21 +161,19 @@ async def update_job_posting(
         # Route to the correct table
         if job_type == "internal":
             logger.debug("Updating internal job with ID %s: %s", job_id, update_data)
-            response = (
+            response = await run_query(
                 supabase
                 .table("internal_hiring_jobs")
                 .update(update_data)
                 .eq("id", job_id)
-                .execute()
             )
         elif job_type == "external":
             logger.debug("Updating external job with ID %s: %s", job_id, update_data)
-            response = (
+            response = await run_query(
                 supabase
                 .table("external_hiring_jobs")
                 .update(update_data)
                 .eq("id", job_id)
-                .execute()
             )
         else:
             raise HTTPException(
@@ -211,6 +197,7 @@ async def update_job_posting(
                 detail="Job posting not found",
             )
 
+        job_list_responses.bump(job_type)
         logger.info("Job posting updated successfully: %s", response.data)
         return {
             "message": "Job posting updated successfully",
@@ -240,21 +227,19 @@ async def delete_job_posting(
         # Route to the correct table
         if job_type == "internal":
             logger.debug("Deleting internal job with ID %s", job_id)
-            response = (
+            response = await run_query(
                 supabase
                 .table("internal_hiring_jobs")
                 .delete()
                 .eq("id", job_id)
-                .execute()
             )
         elif job_type == "external":
             logger.debug("Deleting external job with ID %s", job_id)
-            response = (
+            response = await run_query(
                 supabase
                 .table("external_hiring_jobs")
                 .delete()
                 .eq("id", job_id)
-                .execute()
             )
         else:
             raise HTTPException(
@@ -276,6 +261,7 @@ async def delete_job_posting(
                 detail="Job posting not found",
             )
 
+        job_list_responses.bump(job_type)
         logger.info("Job posting deleted successfully: %s", response.data)
         return {
             "message": "Job posting deleted successfully",
@@ -375,13 +361,9 @@ async def job_applications(
                 detail="Resume file is required",
             )
 
-        # Save resume to temp path
-        tmp_path = f"/tmp/{resume_file.filename}"
-        with open(tmp_path, "wb") as f:
-            f.write(await resume_file.read())
-
-        # Upload to MinIO and get object name
-        resume_link = await upload_file(file_path=tmp_path)
+        # Stream resume to MinIO under a per-application object name
+        object_name = build_object_name(f"resume_{job_type}_{job_id}", resume_file.filename)
+        resume_link = await upload_stream(resume_file, object_name)
 
         data = {
             "job_id": job_id,
@@ -396,10 +378,10 @@ async def job_applications(
 
         if job_type == "internal":
             logger.info("Inserting application into internal_job_applications for job_id=%s", job_id)
-            response = supabase.table("internal_job_applications").insert(data).execute()
+            response = await run_query(supabase.table("internal_job_applications").insert(data))
         elif job_type == "external":
             logger.info("Inserting application into external_job_applications for job_id=%s", job_id)
-            response = supabase.table("external_job_applications").insert(data).execute()
+            response = await run_query(supabase.table("external_job_applications").insert(data))
         else:
             logger.error("Invalid job_type provided: %s", job_type)
             raise HTTPException(
@@ -432,6 +414,95 @@ async def job_applications(
 
 
 
+@router.post("/applications/{job_type}/{job_id}/upload_url", summary="Get a presigned URL to upload a resume directly to storage")
+async def job_application_upload_url(
+    job_type: str,
+    job_id: str,
+    payload: UploadUrlRequest,
+):
+    """
+    Step 1 of the direct upload flow: returns a presigned POST policy scoped
+    to a single resume object. The browser uploads the file to MinIO itself
+    and then calls the finalize route with the returned object_name.
+    """
+    try:
+        if job_type not in ("internal", "external"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid job_type. Use 'internal' or 'external'.",
+            )
+        object_name = build_object_name(f"resume_{job_type}_{job_id}", payload.filename)
+        logger.info("Issuing resume upload policy for job_id=%s object=%s", job_id, object_name)
+        return presign_upload(object_name, payload.content_type)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error issuing upload URL for job_id=%s: %s", job_id, str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create upload URL",
+        )
+
+
+@router.post("/applications/{job_type}/{job_id}/finalize", summary="Record a job application whose resume was uploaded directly")
+async def finalize_job_application(
+    job_type: str,
+    job_id: str,
+    payload: FinalizeJobApplication,
+    supabase: Client = Depends(get_supabase_client),
+):
+    """
+    Step 2 of the direct upload flow: checks the resume object exists in
+    MinIO and then inserts the application row.
+    """
+    try:
+        logger.info("Finalizing application for job_id=%s", job_id)
+        if job_type not in ("internal", "external"):
+            logger.error("Invalid job_type provided: %s", job_type)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid job_type. Use 'internal' or 'external'.",
+            )
+
+        await verify_uploaded_object(payload.resume_object, prefix=f"resume_{job_type}_{job_id}")
+
+        data = {
+            "job_id": job_id,
+            "applicant_data": payload.application_data,  # matches DB column
+            "email": payload.email,
+            "mobile": payload.mobile,
+            "resume_link": payload.resume_object,
+            "remarks": payload.remarks,
+            "recruiter_id": payload.recruiter_id,
+            "application_status": payload.application_status,
+        }
+        response = await run_query(supabase.table(f"{job_type}_job_applications").insert(data))
+
+        if getattr(response, "error", None):
+            logger.error("Failed to submit application for job_id=%s: %s", job_id, response.error)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to submit job application",
+            )
+
+        logger.info("Application finalized successfully for job_id=%s: %s", job_id, response.data)
+        return {
+            "message": "Application submitted successfully",
+            "data": response.data,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error finalizing application for job_id=%s: %s", job_id, str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to submit job application",
+        )
+
+
+
 @router.get("/job/applications/{job_type}/{job_id}", summary="Get job applications for a job posting")
 async def get_job_applications(
     job_type: str,
@@ -443,20 +514,18 @@ async def get_job_applications(
         logger.info("Fetching applications for job_id=%s", job_id)
 
         if job_type == "internal":
-            response = (
+            response = await run_query(
                 supabase
                 .table("internal_job_applications")
                 .select("*")
                 .eq("job_id", job_id)
-                .execute()
             )  # returns .data as a list of dicts [web:15]
         elif job_type == "external":
-            response = (
+            response = await run_query(
                 supabase
                 .table("external_job_applications")
                 .select("*")
                 .eq("job_id", job_id)
-                .execute()
             )
         else:
             logger.error("Invalid job_type provided: %s", job_type)
@@ -473,10 +542,11 @@ async def get_job_applications(
             )
 
         # response.data is a list of dicts; update each dict's resume_link
+        rows = response.data or []
+        resume_urls = await get_file_urls(row.get("resume_link") for row in rows)
         applications = []
-        for row in response.data or []:
-            object_name = row.get("resume_link")
-            resume_url = await get_file_url(object_name=object_name) if object_name else None
+        for row in rows:
+            resume_url = resume_urls.get(row.get("resume_link"))
 
             applications.append({
                 **row,
@@ -516,21 +586,19 @@ async def update_job_application(
         # Route to the correct table
         if job_type == "internal":
             logger.debug("Updating internal application with ID %s: %s", application_id, update_data)
-            response = (
+            response = await run_query(
                 supabase
                 .table("internal_job_applications")
                 .update(update_data)
                 .eq("id", application_id)
-                .execute()
             )
         elif job_type == "external":
             logger.debug("Updating external application with ID %s: %s", application_id, update_data)
-            response = (
+            response = await run_query(
                 supabase
                 .table("external_job_applications")
                 .update(update_data)
                 .eq("id", application_id)
-                .execute()
             )
         else:
             raise HTTPException(
@@ -583,9 +651,9 @@ async def get_job_by_id(
     try:
         logger.info("Fetching job details for job_id=%s", job_id)
         if job_type == 'internal':
-            res = supabase.table("internal_hiring_jobs").select("*").eq("job_id", job_id).maybe_single().execute()  # [web:15][web:172]
+            res = await run_query(supabase.table("internal_hiring_jobs").select("*").eq("job_id", job_id).maybe_single())  # [web:15][web:172]
         elif job_type == 'external':
-            res = supabase.table("external_hiring_jobs").select("*").eq("job_id", job_id).maybe_single().execute()  # [web:15][web:172]
+            res = await run_query(supabase.table("external_hiring_jobs").select("*").eq("job_id", job_id).maybe_single())  # [web:15][web:172]
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -642,9 +710,9 @@ async def post_job_to_linkedin(
         
         # Fetch job from Supabase
         if job_type == 'internal':
-            res = supabase.table("internal_hiring_jobs").select("*").eq("id", job_id).maybe_single().execute()
+            res = await run_query(supabase.table("internal_hiring_jobs").select("*").eq("id", job_id).maybe_single())
         elif job_type == 'external':
-            res = supabase.table("external_hiring_jobs").select("*").eq("id", job_id).maybe_single().execute()
+            res = await run_query(supabase.table("external_hiring_jobs").select("*").eq("id", job_id).maybe_single())
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -672,7 +740,7 @@ async def post_job_to_linkedin(
         
         logger.info("🔑 Requesting LinkedIn token for client: %s...", LINKEDIN_CLIENT_ID[:8])
         
-        token_response = requests.post(token_url, data=token_data, headers=token_headers, timeout=30)
+        token_response = await http_request("POST", token_url, data=token_data, headers=token_headers, timeout=30)
         logger.info("📡 Token response: %s", token_response.status_code)
         logger.info("📄 Token body: %s", token_response.text[:500])  # First 500 chars
         
@@ -750,7 +818,7 @@ async def post_job_to_linkedin(
         }
         
         logger.info("🚀 Posting job to LinkedIn...")
-        response = requests.post(api_url, headers=headers, json=linkedin_payload, timeout=60)
+        response = await http_request("POST", api_url, headers=headers, json=linkedin_payload, timeout=60)
         logger.info("📡 LinkedIn response: %s - %s", response.status_code, response.text[:500])
         
         response.raise_for_status()
@@ -770,11 +838,11 @@ async def post_job_to_linkedin(
             }
         }
         
-    except requests.exceptions.HTTPError as e:
-        error_detail = e.response.text if hasattr(e, 'response') and e.response else str(e)
+    except httpx.HTTPStatusError as e:
+        error_detail = e.response.text or str(e)
         logger.error("LinkedIn API error for job_id=%s: %s", job_id, error_detail)
         raise HTTPException(
-            status_code=getattr(e.response, 'status_code', 500),
+            status_code=e.response.status_code,
             detail=f"LinkedIn API error: {error_detail}"
         )
     except Exception as e:
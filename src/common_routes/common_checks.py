@@ -3,12 +3,48 @@ import secrets
 import string
 import os
 from supabase import create_client
-from fastapi import APIRouter, HTTPException, status, Depends
+from supabase.lib.client_options import SyncClientOptions
+import httpx
+import threading
+import random
+import hashlib
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+import base64
+import json
+from fastapi import APIRouter, HTTPException, status, Depends, Response
+from fastapi.encoders import jsonable_encoder
+from typing import Awaitable, Callable, Hashable
 import aiosmtplib
 import asyncio
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from .common_setting import SUPABASE_URL, SUPABASE_ANON_KEY,SMTP_HOST,SMTP_PORT,SMTP_USERNAME,SMTP_PASSWORD
+from .common_setting import (
+    SUPABASE_POOL_MAX_CONNECTIONS,
+    SUPABASE_POOL_MAX_KEEPALIVE,
+    SUPABASE_KEEPALIVE_EXPIRY,
+    SUPABASE_CONNECT_TIMEOUT,
+    SUPABASE_READ_TIMEOUT,
+    SUPABASE_QUERY_WORKERS,
+)
+from .common_setting import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_MAX_PER_HOST,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_TIMEOUT,
+    HTTP_TIMEOUT_JITTER,
+    HTTP_RETRIES,
+    HTTP_BACKOFF_BASE,
+    HTTP_BACKOFF_MAX,
+    HTTP_LATENCY_SAMPLES,
+)
+from .common_setting import RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_AGE
+from .common_setting import USER_PAGE_SIZE
 import smtplib
 import ssl
 from jinja2 import Template
@@ -66,16 +102,81 @@ async def generate_user_based_password(
 
 
 
-def get_supabase_client() -> Client:
-    try:
-        logger.debug("Creating Supabase client for user routes")
+# Process-wide Supabase client, built once in the app lifespan and shared by
+# every request through Depends(get_supabase_client).
+_supabase_client: Client | None = None
+_supabase_http: httpx.Client | None = None
+_supabase_lock = threading.Lock()
+_query_executor: ThreadPoolExecutor | None = None
+
+
+def init_supabase_client() -> Client:
+    """
+    Build the shared Supabase client on top of a pooled keep-alive
+    httpx client. Safe to call more than once; later calls reuse it.
+    """
+    global _supabase_client, _supabase_http, _query_executor
+    with _supabase_lock:
+        if _query_executor is None:
+            _query_executor = ThreadPoolExecutor(
+                max_workers=SUPABASE_QUERY_WORKERS,
+                thread_name_prefix="supabase-query",
+            )
+        if _supabase_client is not None:
+            return _supabase_client
+
         url = SUPABASE_URL
         key = SUPABASE_ANON_KEY # use service key for writes [web:161]
-        print(f"Supabase URL: {url}, Key: {key}")
         if not url or not key:
             logger.warning("Supabase URL or key not configured")
             raise RuntimeError("Supabase URL/key not configured")
-        return create_client(url, key)
+
+        _supabase_http = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(SUPABASE_READ_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+            follow_redirects=True,
+            http2=True,
+        )
+        _supabase_client = create_client(
+            url,
+            key,
+            options=SyncClientOptions(httpx_client=_supabase_http),
+        )
+        logger.info(
+            "Supabase client initialised (max_connections=%d, keepalive=%d)",
+            SUPABASE_POOL_MAX_CONNECTIONS,
+            SUPABASE_POOL_MAX_KEEPALIVE,
+        )
+        return _supabase_client
+
+
+def close_supabase_client() -> None:
+    """
+    Drain the query threads and close the pooled HTTP connections on shutdown.
+    """
+    global _supabase_client, _supabase_http, _query_executor
+    with _supabase_lock:
+        if _query_executor is not None:
+            _query_executor.shutdown(wait=True)
+        if _supabase_http is not None:
+            _supabase_http.close()
+            logger.info("Supabase HTTP pool closed")
+        _supabase_client = None
+        _supabase_http = None
+        _query_executor = None
+
+
+def get_supabase_client() -> Client:
+    try:
+        if _supabase_client is not None:
+            return _supabase_client
+        # Lifespan did not run (e.g. scripts); build the shared client lazily
+        logger.debug("Shared Supabase client missing, initialising lazily")
+        return init_supabase_client()
     except RuntimeError as re:
         raise re
     except Exception as e:
@@ -88,6 +189,328 @@ def get_supabase_client() -> Client:
 
 
 
+async def run_query(query: Any) -> Any:
+    """
+    Await a supabase-py query builder without blocking the event loop.
+    The synchronous .execute() runs on a bounded thread pool, so at most
+    SUPABASE_QUERY_WORKERS round trips are in flight per worker.
+    """
+    executor = _query_executor
+    if executor is None:
+        init_supabase_client()
+        executor = _query_executor
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, query.execute)
+
+
+
+
+# Process-wide async client for outbound calls to third-party APIs, opened
+# and closed in the app lifespan. Use http_request() rather than the client
+# directly so calls get per-host limits, retries and latency stats.
+_http_client: httpx.AsyncClient | None = None
+_host_slots: dict[str, asyncio.Semaphore] = {}
+_host_stats: dict[str, "HostStats"] = {}
+
+# Retried for any method: the server did not act on the request
+RETRY_ANY_STATUSES = {429}
+# Retried for idempotent methods only
+RETRY_IDEMPOTENT_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# The request never reached the server, so retrying is safe for any method
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class HostStats:
+    """
+    Request counts and a window of recent latencies for one host.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latencies: deque[float] = deque(maxlen=HTTP_LATENCY_SAMPLES)
+
+    def record(self, seconds: float, error: bool) -> None:
+        self.requests += 1
+        self.errors += int(error)
+        self.latencies.append(seconds * 1000)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.latencies)
+
+        def percentile(p: float) -> float | None:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(ordered[-1], 1) if ordered else None,
+        }
+
+
+def init_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+        logger.info(
+            "Outbound HTTP client initialised (max_connections=%d, per_host=%d)",
+            HTTP_MAX_CONNECTIONS,
+            HTTP_MAX_PER_HOST,
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        logger.info("Outbound HTTP client closed: %s", http_host_stats())
+        _http_client = None
+    _host_slots.clear()
+
+
+def http_host_stats() -> dict:
+    return {host: stats.snapshot() for host, stats in _host_stats.items()}
+
+
+def _backoff(attempt: int, response: httpx.Response | None = None) -> float:
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return min(float(retry_after), HTTP_BACKOFF_MAX)
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+async def http_request(
+    method: str,
+    url: str,
+    *,
+    timeout: float | None = None,
+    retries: int = HTTP_RETRIES,
+    **kwargs: Any,
+) -> httpx.Response:
+    """
+    Send a request through the shared client. Connection failures and
+    429s are retried for any method; read errors and 502/503/504 only for
+    idempotent ones, so a POST that may have been applied isn't repeated.
+    The last response is returned as is; callers check its status.
+    """
+    method = method.upper()
+    client = init_http_client()
+    host = httpx.URL(url).host
+    slots = _host_slots.setdefault(host, asyncio.Semaphore(HTTP_MAX_PER_HOST))
+    stats = _host_stats.setdefault(host, HostStats())
+    base_timeout = timeout or HTTP_TIMEOUT
+
+    for attempt in range(retries + 1):
+        request_timeout = httpx.Timeout(
+            base_timeout * random.uniform(1, 1 + HTTP_TIMEOUT_JITTER),
+            connect=HTTP_CONNECT_TIMEOUT,
+        )
+        async with slots:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, timeout=request_timeout, **kwargs)
+            except httpx.TransportError as e:
+                stats.record(time.perf_counter() - started, error=True)
+                if attempt == retries or not (isinstance(e, NOT_SENT_ERRORS) or method in IDEMPOTENT_METHODS):
+                    raise
+                delay = _backoff(attempt)
+                reason = type(e).__name__
+            else:
+                stats.record(time.perf_counter() - started, error=response.status_code >= 500)
+                retryable = response.status_code in RETRY_ANY_STATUSES or (
+                    response.status_code in RETRY_IDEMPOTENT_STATUSES and method in IDEMPOTENT_METHODS
+                )
+                if attempt == retries or not retryable:
+                    return response
+                delay = _backoff(attempt, response)
+                reason = response.status_code
+                await response.aclose()
+
+        stats.retries += 1
+        logger.warning("%s %s failed (%s), retry %d/%d in %.2fs", method, host, reason, attempt + 1, retries, delay)
+        await asyncio.sleep(delay)
+
+
+class CachedResponse:
+    __slots__ = ("etag", "body", "stored_at")
+
+    def __init__(self, etag: str, body: bytes):
+        self.etag = etag
+        self.body = body
+        self.stored_at = time.monotonic()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class ResponseCache:
+    """
+    Serialized JSON bodies of one GET route, keyed by its parameters, each
+    with a content-hash ETag. A cached body is served (or answered with 304
+    when the client already has it) without querying or serializing again.
+    Write routes call bump() for the keys they change; bumping also makes a
+    load that was in flight at the time skip storing its result.
+    """
+
+    def __init__(self, name: str, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self._entries: dict[Hashable, CachedResponse] = {}
+        self._versions: dict[Hashable, int] = {}
+        self._generation = 0
+
+    def _version(self, key: Hashable) -> tuple[int, int]:
+        return self._generation, self._versions.get(key, 0)
+
+    def bump(self, key: Hashable | None = None) -> None:
+        """
+        Invalidate one key, or every key when None.
+        """
+        if key is None:
+            self._generation += 1
+            self._entries.clear()
+        else:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._entries.pop(key, None)
+
+    async def respond(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        if_none_match: str | None,
+    ) -> Response:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.stored_at > self.ttl:
+            version = self._version(key)
+            payload = jsonable_encoder(await loader())
+            body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            entry = CachedResponse(f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', body)
+            if self._version(key) == version:
+                self._entries[key] = entry
+
+        cache_control = f"private, max-age={RESPONSE_CACHE_MAX_AGE}" if RESPONSE_CACHE_MAX_AGE else "private, no-cache"
+        headers = {"ETag": entry.etag, "Cache-Control": cache_control}
+        if etag_matches(if_none_match, entry.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# Columns a user list view may ask for. `password` is deliberately absent.
+USER_LIST_COLUMNS = (
+    "id",
+    "name",
+    "email",
+    "office_mail",
+    "role",
+    "mobile",
+    "designation",
+    "user_profile_picture",
+    "createdby",
+    "created_at",
+)
+# Keyset columns, always fetched so the next cursor can be built.
+USER_CURSOR_COLUMNS = ("created_at", "id")
+
+
+def resolve_user_columns(fields: str | None) -> str:
+    """
+    Turn a comma separated `fields` query param into a PostgREST select
+    list, restricted to USER_LIST_COLUMNS. Defaults to every list column.
+    """
+    if not fields:
+        requested = list(USER_LIST_COLUMNS)
+    else:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in USER_LIST_COLUMNS]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}",
+            )
+    for col in USER_CURSOR_COLUMNS:
+        if col not in requested:
+            requested.append(col)
+    return ",".join(requested)
+
+
+def encode_cursor(row: dict, column: str = "created_at") -> str:
+    raw = json.dumps([row[column], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def page_limit(limit: int | None, after: str | None) -> int | None:
+    """
+    Page size for a list route. A request with neither limit nor after
+    predates pagination and still gets every row (None).
+    """
+    if limit is None and after:
+        return USER_PAGE_SIZE
+    return limit
+
+
+def apply_keyset(query: Any, after: str | None, limit: int | None, column: str = "created_at") -> Any:
+    """
+    Order by (column, id) and start strictly after the cursor row.
+    Rows inserted later sort after every existing row, so a client
+    walking pages never sees duplicates or gaps.
+    One extra row is fetched to know whether another page exists;
+    limit None returns every remaining row.
+    """
+    if after:
+        value, row_id = decode_cursor(after)
+        query = query.or_(
+            f'{column}.gt."{value}",'
+            f'and({column}.eq."{value}",id.gt."{row_id}")'
+        )
+    query = query.order(column).order("id")
+    return query if limit is None else query.limit(limit + 1)
+
+
+def split_page(rows: list[dict], limit: int | None, column: str = "created_at") -> tuple[list[dict], str | None]:
+    """
+    Trim the look-ahead row and return (page, next_cursor).
+    """
+    if limit is not None and len(rows) > limit:
+        page = rows[:limit]
+        return page, encode_cursor(page[-1], column)
+    return rows, None
+
+
+
+
 async def send_email(template_path, data, receiver_email,subject, smtp_server, smtp_port, username, password):
     try:
         # Load HTML template
@@ -20,4 +20,14 @@ class UserUpdate(BaseModel):
 
 class ChangePasswordRequest(BaseModel):
     user_id: str
-    new_password: str
\ No newline at end of file
+    new_password: str
+
+
+class ProfilePictureUploadRequest(BaseModel):
+    email: EmailStr
+    filename: str
+    content_type: str
+
+
+class ProfilePictureFinalize(BaseModel):
+    object_name: str
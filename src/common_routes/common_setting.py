@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -7,4 +8,51 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
\ No newline at end of file
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+
+# Shared Supabase HTTP pool (one client per worker process)
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "30"))
+# Threads used to run blocking supabase-py .execute() calls off the event loop
+SUPABASE_QUERY_WORKERS = int(os.getenv("SUPABASE_QUERY_WORKERS", "16"))
+
+# Shared async HTTP client for outbound calls (holiday API, LinkedIn).
+# HTTP_MAX_PER_HOST caps concurrent requests to any one host. Timeouts are
+# stretched by up to HTTP_TIMEOUT_JITTER (fraction) so requests that
+# started together don't all time out and retry together. Retries back off
+# exponentially from HTTP_BACKOFF_BASE seconds with full jitter.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_TIMEOUT_JITTER = float(os.getenv("HTTP_TIMEOUT_JITTER", "0.1"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.25"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "4"))
+# Latency samples kept per host for the percentiles in /ops/http
+HTTP_LATENCY_SAMPLES = int(os.getenv("HTTP_LATENCY_SAMPLES", "512"))
+
+# Page size of the user list routes when a client pages with `after` but
+# sends no `limit`. Requests with neither still get every row.
+USER_PAGE_SIZE = int(os.getenv("USER_PAGE_SIZE", "100"))
+
+# Conditional GETs on frequently polled lists. Serialized bodies and their
+# ETags are reused until a write route bumps them, or for at most
+# RESPONSE_CACHE_TTL_SECONDS so writes made through other workers show up.
+# Clients may reuse a response for RESPONSE_CACHE_MAX_AGE seconds without
+# asking; 0 means they revalidate every time (usually a cheap 304).
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", "0"))
+
+# In-process periodic jobs (see common_routes/scheduler.py). Exclusive jobs
+# run in one worker per host, picked with flock files in SCHEDULER_LOCK_DIR;
+# the other workers retry every SCHEDULER_STANDBY_RETRY_SECONDS and take
+# over if that worker exits.
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+SCHEDULER_LOCK_DIR = os.getenv("SCHEDULER_LOCK_DIR", os.path.join(tempfile.gettempdir(), "hrm_jobs"))
+SCHEDULER_STANDBY_RETRY_SECONDS = float(os.getenv("SCHEDULER_STANDBY_RETRY_SECONDS", "60"))
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+from src.common_routes.common_checks import http_host_stats
+from src.common_routes.scheduler import scheduler
+from src.login.login_checks import get_current_user_id
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/ops", tags=["Operations"], dependencies=[Depends(get_current_user_id)])
+
+
+@router.get("/http", summary="Per-host latency of outbound HTTP calls")
+async def outbound_http_stats():
+    """
+    Counts and latency percentiles (ms) over the recent requests each
+    upstream host served this worker, including retries.
+    """
+    return http_host_stats()
+
+
+@router.get("/jobs", summary="Status and last-run timings of background jobs")
+async def background_jobs():
+    """
+    Jobs of the worker serving the request. Exclusive jobs show
+    active=false in workers that are standing by for the lock.
+    """
+    return scheduler.status()
@@ -0,0 +1,158 @@
+"""
+In-process runner for periodic background jobs, started from the app
+lifespan.
+
+Each job runs on its own asyncio task: once at startup (after an optional
+delay) and then every `interval` seconds. An exclusive job changes shared
+state (e.g. inserts into Supabase) and runs in only one worker process:
+each worker tries a non-blocking flock on the job's lock file and the
+winner keeps it until it exits, at which point the kernel releases it and
+a standby worker takes over. The lock is per host; workers on different
+hosts each elect their own runner. Jobs that only warm per-process caches
+are not exclusive and run in every worker.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TextIO
+
+from .common_setting import SCHEDULER_LOCK_DIR, SCHEDULER_STANDBY_RETRY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        func: Callable[[], Awaitable[Any]],
+        exclusive: bool = False,
+        initial_delay: float = 0.0,
+    ):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.exclusive = exclusive
+        self.initial_delay = initial_delay
+        self.task: Optional[asyncio.Task] = None
+        self.lock_file: Optional[TextIO] = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.last_started_at: Optional[float] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_result: Any = None
+        self.next_run_at: Optional[float] = None
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "exclusive": self.exclusive,
+            # Exclusive jobs only run in the worker holding the lock
+            "active": not self.exclusive or self.lock_file is not None,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started_at": self.last_started_at,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+            "last_result": self.last_result,
+            "next_run_at": self.next_run_at,
+        }
+
+
+class JobScheduler:
+    def __init__(self, lock_dir: str = SCHEDULER_LOCK_DIR):
+        self.lock_dir = lock_dir
+        self._jobs: Dict[str, PeriodicJob] = {}
+
+    def add(
+        self,
+        name: str,
+        interval: float,
+        func: Callable[[], Awaitable[Any]],
+        exclusive: bool = False,
+        initial_delay: float = 0.0,
+    ) -> PeriodicJob:
+        job = PeriodicJob(name, interval, func, exclusive, initial_delay)
+        self._jobs[name] = job
+        return job
+
+    def start(self) -> None:
+        for job in self._jobs.values():
+            if job.task is None:
+                job.task = asyncio.create_task(self._loop(job), name=f"job:{job.name}")
+        logger.info("Scheduler started with jobs: %s", ", ".join(self._jobs) or "none")
+
+    async def stop(self) -> None:
+        for job in self._jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+                try:
+                    await job.task
+                except asyncio.CancelledError:
+                    pass
+                job.task = None
+            self._release(job)
+
+    def status(self) -> dict:
+        return {"pid": os.getpid(), "jobs": [job.status() for job in self._jobs.values()]}
+
+    def _acquire(self, job: PeriodicJob) -> bool:
+        if job.lock_file is not None:
+            return True
+        os.makedirs(self.lock_dir, exist_ok=True)
+        lock_file = open(os.path.join(self.lock_dir, f"{job.name}.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        job.lock_file = lock_file
+        logger.info("Worker %d runs exclusive job %s", os.getpid(), job.name)
+        return True
+
+    def _release(self, job: PeriodicJob) -> None:
+        if job.lock_file is not None:
+            fcntl.flock(job.lock_file, fcntl.LOCK_UN)
+            job.lock_file.close()
+            job.lock_file = None
+
+    async def run(self, job: PeriodicJob) -> None:
+        """
+        One run of the job; failures are recorded, never raised.
+        """
+        job.running = True
+        job.last_started_at = time.time()
+        started = time.perf_counter()
+        try:
+            job.last_result = await job.func()
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(getattr(e, "detail", e))
+            logger.exception("Job %s failed: %s", job.name, job.last_error)
+        finally:
+            job.running = False
+            job.runs += 1
+            job.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("Job %s finished in %.1f ms", job.name, job.last_duration_ms)
+
+    async def _loop(self, job: PeriodicJob) -> None:
+        await asyncio.sleep(job.initial_delay)
+        while True:
+            if job.exclusive and not self._acquire(job):
+                delay = min(job.interval, SCHEDULER_STANDBY_RETRY_SECONDS)
+            else:
+                await self.run(job)
+                delay = job.interval
+            job.next_run_at = time.time() + delay
+            await asyncio.sleep(delay)
+
+
+scheduler = JobScheduler()
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, HTTPException, status, Depends,BackgroundTasks
+from fastapi import APIRouter, HTTPException, status, Depends,BackgroundTasks,Query,Response
 from supabase import Client
-from .common_models import UserCreate,UserUpdate,ChangePasswordRequest
+from .common_models import UserCreate,UserUpdate,ChangePasswordRequest,ProfilePictureUploadRequest,ProfilePictureFinalize
 import os
 from supabase import create_client
 from dotenv import load_dotenv
 import logging
 from src.login.login_checks import get_current_user_id 
-from .common_checks import get_supabase_client, generate_user_based_password , send_email
+from .common_checks import get_supabase_client, generate_user_based_password , send_email, run_query
+from .common_checks import resolve_user_columns, apply_keyset, split_page, page_limit
 from .common_setting import SUPABASE_URL, SUPABASE_ANON_KEY,SMTP_HOST,SMTP_PORT,SMTP_USERNAME,SMTP_PASSWORD
-from src.career_routes.career_checks import upload_file,get_file_url
+from .common_setting import USER_PAGE_SIZE
+from src.career_routes.career_checks import upload_stream,get_file_url,get_file_urls
+from src.career_routes.career_checks import build_object_name, presign_upload, verify_uploaded_object, read_object
+from src.attendance_routes.attendance_checks import try_enroll_face, FACE_ENCODING_COLUMN, FACE_SAMPLES_COLUMN
+from src.attendance_routes.face_index import store_face, drop_face
 load_dotenv()
 router = APIRouter(prefix="/users", tags=["users"])
 logger = logging.getLogger(__name__)
@@ -143,9 +148,6 @@ logger = logging.getLogger(__name__)
 
 from fastapi import UploadFile, File, Form, Depends, BackgroundTasks, HTTPException, status
 from typing import Optional
-import tempfile
-import os
-import shutil
 
 @router.post("/create/user", status_code=status.HTTP_201_CREATED)
 async def create_user(
@@ -158,6 +160,7 @@ async def create_user(
     designation: Optional[str] = Form(None),
     team_lead_id: Optional[str] = Form(None),
     profile_picture: Optional[UploadFile] = File(None),
+    profile_picture_object: Optional[str] = Form(None),  # already uploaded via /profile_picture/upload_url
     supabase: Client = Depends(get_supabase_client),
     background_tasks: BackgroundTasks = None,
     user_id: str = Depends(get_current_user_id)
@@ -165,13 +168,12 @@ async def create_user(
     # Check duplicate email
     try:
         logger.info("User creation attempt by user_id=%s for email=%s", user_id, email)
-        existing = (
+        existing = await run_query(
             supabase
             .table("users")
             .select("id")
             .or_(f"email.eq.{email},mobile.eq.{mobile}")
             .maybe_single()
-            .execute()
         )
         if existing is not None:
             logger.warning("User creation failed: email or mobile already exists email=%s mobile=%s", email, mobile)
@@ -189,20 +191,21 @@ async def create_user(
 
         # Handle profile picture upload
         profile_picture_url = None
+        face_encoding = None
         if profile_picture and profile_picture.filename:
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{profile_picture.filename}") as tmp_file:
-                shutil.copyfileobj(profile_picture.file, tmp_file)
-                tmp_file_path = tmp_file.name
-            
-            try:
-                # Upload to MinIO and get object name
-                object_name = await upload_file(tmp_file_path, f"user_profile_{email}_{profile_picture.filename}")
-                profile_picture_url = object_name
-                logger.info("Profile picture uploaded: %s", profile_picture_url)
-            finally:
-                # Clean up temp file
-                os.unlink(tmp_file_path)
+            # Stream straight to MinIO and keep the object name
+            object_name = await upload_stream(profile_picture, f"user_profile_{email}_{profile_picture.filename}")
+            profile_picture_url = object_name
+            logger.info("Profile picture uploaded: %s", profile_picture_url)
+            # Encode the face once here so attendance checks never redo it
+            await profile_picture.seek(0)
+            face_encoding = await try_enroll_face(await profile_picture.read())
+        elif profile_picture_object:
+            # Uploaded directly to MinIO; only record it once it really exists
+            await verify_uploaded_object(profile_picture_object, prefix=f"user_profile_{email}", content_type_prefix="image/")
+            profile_picture_url = profile_picture_object
+            logger.info("Profile picture recorded from direct upload: %s", profile_picture_url)
+            face_encoding = await try_enroll_face(await read_object(profile_picture_object))
 
         # Prepare user data for insertion
         to_insert = {
@@ -215,6 +218,7 @@ async def create_user(
             "createdby": created_by,
             "designation": designation,
             "user_profile_picture": profile_picture_url,  # Add to users table
+            FACE_ENCODING_COLUMN: face_encoding,
         }
 
         mail_data = {
@@ -238,7 +242,7 @@ async def create_user(
         )
         logger.info("Email sending task added for user email=%s", email)
 
-        res = supabase.table("users").insert(to_insert).execute()
+        res = await run_query(supabase.table("users").insert(to_insert))
         if not res:
             logger.error("User creation failed for email=%s", email)
             raise HTTPException(
@@ -247,22 +251,23 @@ async def create_user(
             )
         
         created = res.data[0]
+        if face_encoding is not None:
+            await store_face(created["id"], face_encoding)
         
         if designation == "team_lead":
-            adding_team_leader = supabase.table("teams").insert({"team_lead": created.get("id")}).execute()
+            adding_team_leader = await run_query(supabase.table("teams").insert({"team_lead": created.get("id")}))
             logger.info("Additional setup for team leader email=%s", adding_team_leader)
 
         elif designation == "team_member":
             if not team_lead_id:
                 raise HTTPException(status_code=400, detail="team_lead_id required for team_member")
             
-            team_res = (
+            team_res = await run_query(
                 supabase
                 .table("teams")
                 .select("id, team_members")
                 .eq("team_lead", team_lead_id)
                 .maybe_single()
-                .execute()
             )
             team = team_res.data
             if not team:
@@ -271,7 +276,7 @@ async def create_user(
             current_members = team.get("team_members") or []
             if created["id"] not in current_members:
                 new_members = current_members + [created["id"]]
-                supabase.table("teams").update({"team_members": new_members}).eq("team_lead", team_lead_id).execute()
+                await run_query(supabase.table("teams").update({"team_members": new_members}).eq("team_lead", team_lead_id))
             logger.info("Team member added to team_lead=%s", team_lead_id)
 
         logger.info("User created successfully user_id=%s email=%s", created.get("id"), created.get("email"))
@@ -292,6 +297,96 @@ async def create_user(
         )
 
 
+@router.post("/profile_picture/upload_url", summary="Get a presigned URL to upload a profile picture directly to storage")
+async def profile_picture_upload_url(
+    payload: ProfilePictureUploadRequest,
+    _: str = Depends(get_current_user_id),          # require auth
+):
+    """
+    Returns a presigned POST policy for one profile picture object. Upload the
+    image to MinIO with it, then pass the object_name to create_user
+    (profile_picture_object) or to /profile_picture/finalize/{user_id}.
+    """
+    try:
+        if not payload.content_type.startswith("image/"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Only image files allowed",
+            )
+        object_name = build_object_name(f"user_profile_{payload.email}", payload.filename)
+        logger.info("Issuing profile picture upload policy object=%s", object_name)
+        return presign_upload(object_name, payload.content_type)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.exception("Error issuing profile picture upload URL: %s", str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create upload URL",
+        )
+
+
+@router.post("/profile_picture/finalize/{user_id}", summary="Record a directly uploaded profile picture")
+async def finalize_profile_picture(
+    user_id: str,
+    payload: ProfilePictureFinalize,
+    _: str = Depends(get_current_user_id),          # require auth
+    supabase: Client = Depends(get_supabase_client),
+):
+    """
+    Checks the uploaded object exists and sets it as the user's profile picture.
+    """
+    try:
+        logger.info("Finalizing profile picture for user_id=%s", user_id)
+        res = await run_query(supabase.table("users").select("id, email").eq("id", user_id).maybe_single())
+        if not res or not res.data:
+            logger.warning("User not found user_id=%s", user_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
+
+        await verify_uploaded_object(payload.object_name, prefix=f"user_profile_{res.data['email']}", content_type_prefix="image/")
+        face_encoding = await try_enroll_face(await read_object(payload.object_name))
+
+        update_res = await run_query(
+            supabase
+            .table("users")
+            .update({
+                "user_profile_picture": payload.object_name,
+                FACE_ENCODING_COLUMN: face_encoding,
+                # Re-enrolled from the new picture; earlier enrollment samples no longer apply
+                FACE_SAMPLES_COLUMN: None,
+            })
+            .eq("id", user_id)
+        )
+        if getattr(update_res, "error", None):
+            logger.error("Failed to update profile picture for user_id=%s: %s", user_id, update_res.error)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to update profile picture",
+            )
+
+        if face_encoding is not None:
+            await store_face(user_id, face_encoding)
+        else:
+            await drop_face(user_id)
+
+        logger.info("Profile picture updated for user_id=%s", user_id)
+        return {
+            "id": user_id,
+            "user_profile_picture": await get_file_url(payload.object_name),
+        }
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.exception("Error finalizing profile picture for user_id=%s: %s", user_id, str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update profile picture",
+        )
+
+
 @router.get("/user/profile", summary="Get current user details")
 async def read_me(user_id: str = Depends(get_current_user_id) , supabase: Client = Depends(get_supabase_client)):
     """
@@ -299,7 +394,7 @@ async def read_me(user_id: str = Depends(get_current_user_id) , supabase: Client
     """
     try:
         logger.info("Fetching current user details for user_id=%s", user_id)
-        res = supabase.table("users").select("*").eq("id", user_id).maybe_single().execute()  # [web:15][web:172]
+        res = await run_query(supabase.table("users").select("*").eq("id", user_id).maybe_single())  # [web:15][web:172]
 
         if getattr(res, "error", None):
             logger.error("Failed to fetch user_id=%s: %s", user_id, res.error)
@@ -342,15 +437,23 @@ async def read_me(user_id: str = Depends(get_current_user_id) , supabase: Client
 
 @router.get("/allusers", summary="Get all users")
 async def get_all_users(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description=f"Page size (default {USER_PAGE_SIZE} when paging; omit both limit and after for every row)"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return"),
     _: str = Depends(get_current_user_id),  # require auth
     supabase: Client = Depends(get_supabase_client)
 ):
     """
-    Returns all users from the `users` table with profile picture URLs.
+    Returns one page of users from the `users` table with profile picture URLs.
+    Pass the `X-Next-Cursor` response header back as `after` to get the next page.
+    Without limit and after, every user is returned in one response.
     """
     try:
         logger.info("Fetching all users requested by user_id=%s", _)
-        res = supabase.table("users").select("*").execute()
+        columns = resolve_user_columns(fields)
+        limit = page_limit(limit, after)
+        res = await run_query(apply_keyset(supabase.table("users").select(columns), after, limit))
 
         if getattr(res, "error", None):
             logger.error("Failed to fetch users: %s", res.error)
@@ -359,21 +462,18 @@ async def get_all_users(
                 detail="Failed to fetch users",
             )
 
-        # Process each user to convert object name to full MinIO URL
-        for user_data in res.data:
-            if user_data.get("user_profile_picture"):
-                try:
-                    logger.info("Generating profile picture URL for user_id=%s", user_data["id"])
-                    profile_picture_url = await get_file_url(user_data["user_profile_picture"])
-                    user_data["user_profile_picture"] = profile_picture_url  # Overwrite with full URL
-                except Exception as e:
-                    logger.warning("Failed to generate profile URL for user %s: %s", user_data["id"], e)
-                    user_data["user_profile_picture"] = None  # Fallback to None
-            else:
-                user_data["user_profile_picture"] = None  # Consistent null handling
-
-        logger.info("Fetched and processed %d users", len(res.data))
-        return res.data
+        users, next_cursor = split_page(res.data, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        # Sign every profile picture on the page in one batch
+        picture_urls = await get_file_urls(user_data.get("user_profile_picture") for user_data in users)
+        for user_data in users:
+            if "user_profile_picture" in user_data:
+                user_data["user_profile_picture"] = picture_urls.get(user_data["user_profile_picture"])  # None if missing
+
+        logger.info("Fetched and processed %d users", len(users))
+        return users
         
     except HTTPException as he:
         raise he
@@ -442,7 +542,7 @@ def update_user(
 
 
 @router.delete("/delete/{user_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete user")
-def delete_user(
+async def delete_user(
     user_id: str,
     _: str = Depends(get_current_user_id),          # require auth
     supabase: Client = Depends(get_supabase_client),
@@ -453,12 +553,11 @@ def delete_user(
     try:
         logger.info("Deleting user_id=%s", user_id)
 
-        res = (
+        res = await run_query(
             supabase
             .table("users")
             .delete()
             .eq("id", user_id)
-            .execute()
         )  # [web:239]
 
         if getattr(res, "error", None):
@@ -476,6 +575,7 @@ def delete_user(
                 detail="User not found",
             )
 
+        await drop_face(user_id)
         logger.info("User deleted successfully user_id=%s", user_id)
         return  # 204 No Content
 
@@ -505,7 +605,7 @@ async def reset_user_password(
     try:
         logger.info("Resetting password for user_id=%s", user_id)
         # Fetch user details
-        res = supabase.table("users").select("*").eq("id", user_id).maybe_single().execute()
+        res = await run_query(supabase.table("users").select("*").eq("id", user_id).maybe_single())
         if not res.data:
             logger.warning("User not found for password reset user_id=%s", user_id)
             raise HTTPException(
@@ -516,12 +616,11 @@ async def reset_user_password(
         new_password = await generate_user_based_password(user["name"], user["email"])
         
         # Update password in DB
-        update_res = (
+        update_res = await run_query(
             supabase
             .table("users")
             .update({"password": new_password , "password_updated" : True})
             .eq("id", user_id)
-            .execute()
         )
         if getattr(update_res, "error", None):
             logger.error("Failed to update password for user_id=%s: %s", user_id, update_res)
@@ -583,12 +682,11 @@ async def change_user_password(
         logger.info("Changing password for user_id=%s", data.user_id)
 
         # Update password in DB
-        update_res = (
+        update_res = await run_query(
             supabase
             .table("users")
             .update({"password": data.new_password , "password_updated" : False,"firstlogin":False})
             .eq("id", data.user_id)
-            .execute()
         )
         if getattr(update_res, "error", None):
             logger.error("Failed to change password for user_id=%s: %s", data.user_id, update_res)
@@ -613,15 +711,23 @@ async def change_user_password(
 
 @router.get("/team/leads",summary="Get all team leads")
 async def get_all_team_leads(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description=f"Page size (default {USER_PAGE_SIZE} when paging; omit both limit and after for every row)"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return"),
     _: str = Depends(get_current_user_id),       # require auth
     supabase: Client = Depends(get_supabase_client),
 ):
     """
-    Returns all users with designation 'team_lead'.
+    Returns one page of users with designation 'team_lead'.
     """
     try:
         logger.info("Fetching all team leads requested by user_id=%s", _)
-        res = supabase.table("users").select("*").eq("designation", "team_lead").execute()  # [web:15]
+        columns = resolve_user_columns(fields)
+        limit = page_limit(limit, after)
+        res = await run_query(
+            apply_keyset(supabase.table("users").select(columns).eq("designation", "team_lead"), after, limit)
+        )  # [web:15]
 
         if getattr(res, "error", None):
             logger.error("Failed to fetch team leads: %s", res.error)
@@ -629,21 +735,19 @@ async def get_all_team_leads(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch team leads",
             )
-        
-        for user_data in res.data:
-            if user_data.get("user_profile_picture"):
-                try:
-                    logger.info("Generating profile picture URL for user_id=%s", user_data["id"])
-                    profile_picture_url = await get_file_url(user_data["user_profile_picture"])
-                    user_data["user_profile_picture"] = profile_picture_url  # Overwrite with full URL
-                except Exception as e:
-                    logger.warning("Failed to generate profile URL for user %s: %s", user_data["id"], e)
-                    user_data["user_profile_picture"] = None  # Fallback to None
-            else:
-                user_data["user_profile_picture"] = None  # Consistent null handling
-        logger.info("Fetched %d team leads", len(res.data))
-
-        return res.data
+
+        leads, next_cursor = split_page(res.data, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        # Sign every profile picture on the page in one batch
+        picture_urls = await get_file_urls(user_data.get("user_profile_picture") for user_data in leads)
+        for user_data in leads:
+            if "user_profile_picture" in user_data:
+                user_data["user_profile_picture"] = picture_urls.get(user_data["user_profile_picture"])  # None if missing
+        logger.info("Fetched %d team leads", len(leads))
+
+        return leads
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -656,18 +760,23 @@ async def get_all_team_leads(
 
 @router.get("/team/members",summary="Get all team members")
 async def get_all_team_members(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description=f"Page size (default {USER_PAGE_SIZE} when paging; omit both limit and after for every row)"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return"),
     _: str = Depends(get_current_user_id),       # require auth
     supabase: Client = Depends(get_supabase_client),
 ):
     """
-    Returns all users with designation 'team_member'.
+    Returns one page of users with designation 'team_member'.
     """
     try:
         logger.info("Fetching all team members requested by user_id=%s", _)
-        debug_res = supabase.table("users").select("id, name, designation").execute()
-        logger.info("ALL DESIGNATIONS: %s", [u['designation'] for u in debug_res.data])
-
-        res = supabase.table("users").select("*").eq("designation", "team_member").execute()  # [web:15]
+        columns = resolve_user_columns(fields)
+        limit = page_limit(limit, after)
+        res = await run_query(
+            apply_keyset(supabase.table("users").select(columns).eq("designation", "team_member"), after, limit)
+        )  # [web:15]
 
         if getattr(res, "error", None):
             logger.error("Failed to fetch team members: %s", res.error)
@@ -675,19 +784,18 @@ async def get_all_team_members(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to fetch team members",
             )
-        for user_data in res.data:
-            if user_data.get("user_profile_picture"):
-                try:
-                    logger.info("Generating profile picture URL for user_id=%s", user_data["id"])
-                    profile_picture_url = await get_file_url(user_data["user_profile_picture"])
-                    user_data["user_profile_picture"] = profile_picture_url  # Overwrite with full URL
-                except Exception as e:
-                    logger.warning("Failed to generate profile URL for user %s: %s", user_data["id"], e)
-                    user_data["user_profile_picture"] = None  # Fallback to None
-            else:
-                user_data["user_profile_picture"] = None  # Consistent null handling
-        logger.info("Fetched %d team members", len(res.data))
-        return res.data
+
+        members, next_cursor = split_page(res.data, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        # Sign every profile picture on the page in one batch
+        picture_urls = await get_file_urls(user_data.get("user_profile_picture") for user_data in members)
+        for user_data in members:
+            if "user_profile_picture" in user_data:
+                user_data["user_profile_picture"] = picture_urls.get(user_data["user_profile_picture"])  # None if missing
+        logger.info("Fetched %d team members", len(members))
+        return members
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -710,13 +818,12 @@ async def get_team_members(
     """
     try:
         logger.info("Fetching team members for team_lead_id=%s requested by user_id=%s", team_lead_id, _)
-        team_res = (
+        team_res = await run_query(
             supabase
             .table("teams")
             .select("team_members")
             .eq("team_lead", team_lead_id)
             .maybe_single()
-            .execute()
         )
 
         if getattr(team_res, "error", None):
@@ -733,12 +840,11 @@ async def get_team_members(
 
         member_ids = team["team_members"]
 
-        members_res = (
+        members_res = await run_query(
             supabase
             .table("users")
             .select("*")
             .in_("id", member_ids)
-            .execute()
         )
 
         if getattr(members_res, "error", None):
@@ -748,17 +854,11 @@ async def get_team_members(
                 detail="Failed to fetch team members",
             )
 
+        # Sign every member's profile picture in one batch
+        picture_urls = await get_file_urls(member_data.get("user_profile_picture") for member_data in members_res.data)
         for member_data in members_res.data:
-            if member_data.get("user_profile_picture"):
-                try:
-                    logger.info("Generating profile picture URL for team member %s", member_data["id"])
-                    profile_picture_url = await get_file_url(member_data["user_profile_picture"])
-                    member_data["user_profile_picture"] = profile_picture_url  # Overwrite with full URL
-                except Exception as e:
-                    logger.warning("Failed to generate profile URL for team member %s: %s", member_data["id"], e)
-                    member_data["user_profile_picture"] = None  # Fallback to None
-            else:
-                member_data["user_profile_picture"] = None  # Consistent null handling
+            if "user_profile_picture" in member_data:
+                member_data["user_profile_picture"] = picture_urls.get(member_data["user_profile_picture"])  # None if missing
 
         logger.info("Fetched %d team members for team_lead_id=%s", len(members_res.data), team_lead_id)
         return members_res.data
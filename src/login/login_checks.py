@@ -12,13 +12,14 @@ import os
 from supabase import Client
 from fastapi import HTTPException, status
 import logging
+from src.common_routes.common_checks import get_supabase_client as get_shared_supabase_client
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")  # for docs / clients [web:2][web:7]
 logger = logging.getLogger(__name__)  # module-level logger
 
 
 def get_supabase_client() -> Client:
-    logger.debug("Creating Supabase client")
-    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)  # [web:12]
+    logger.debug("Using shared Supabase client")
+    return get_shared_supabase_client()  # pooled, built in app lifespan
 
 
 